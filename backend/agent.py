@@ -2,18 +2,42 @@
 # El corazón del agente financiero
 
 import os
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 import anthropic
-from memory import agregar_mensaje, obtener_historial
+from memory import agregar_mensaje_async, obtener_historial, turno, SESION_DEFAULT
 from tools import TOOLS, ejecutar_tool
+from contexto import preparar_contexto, ContextoChat
+from metricas import contador, histograma
+from traza import span, anotar
+from prefetch import Precarga
+from atajos import detectar, registrar
+from registro import concluyente
 
 # Cargar API Key del .env con path explícito
 load_dotenv(dotenv_path=Path(__file__).parent / ".env", override=True)
 api_key = os.getenv("ANTHROPIC_API_KEY")
 
-# Inicializar cliente de Anthropic
-cliente = anthropic.Anthropic(api_key=api_key)
+logger = logging.getLogger(__name__)
+
+# Inicializar cliente de Anthropic (async, para no bloquear el event loop de la API)
+cliente = anthropic.AsyncAnthropic(api_key=api_key)
+
+# Las tools son bloqueantes (yfinance, disco): corren en un pool propio y acotado
+# para que un chat lento no le quite workers al resto de los endpoints
+MAX_TOOL_WORKERS = int(os.getenv("MAX_TOOL_WORKERS", "8"))
+_pool_tools = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="tools")
+# Tiempo máximo que se espera a cada tool antes de devolverle un error al modelo
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+# Tiempo máximo en la cola del pool: si todos los workers quedaron colgados con
+# tools vencidas, las nuevas no esperan para siempre a que se libere uno
+TOOL_TIMEOUT_COLA = float(os.getenv("TOOL_TIMEOUT_COLA", str(TOOL_TIMEOUT)))
 
 # Personalidad del agente
 SYSTEM_PROMPT = """Sos un asistente financiero inteligente y amigable.
@@ -33,40 +57,319 @@ También podés manejar la watchlist del usuario:
 - "¿Qué tengo en mi watchlist?" → ver_watchlist
 """
 
-def chat(mensaje_usuario):
+# ─── PROMPT CACHING ───────────────────────────
+
+# TOOLS + SYSTEM_PROMPT son iguales en todas las llamadas: el breakpoint en el
+# system hace que Anthropic cachee ese prefijo (las tools van antes del system)
+SYSTEM_CACHEADO = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
+# Además se puede cachear la conversación hasta el último mensaje, que es lo que
+# se reenvía en cada ronda de tools del mismo turno
+CACHEAR_HISTORIAL = os.getenv("CACHEAR_HISTORIAL", "1") == "1"
+
+_uso = {"requests": 0, "input_tokens": 0, "output_tokens": 0,
+        "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+_uso_lock = threading.Lock()
+
+_tokens = contador("anthropic_tokens_total", "Tokens usados en las llamadas a Claude", ("tipo",))
+_iteraciones = histograma(
+    "agente_iteraciones", "Llamadas a Claude por cada mensaje de chat", ("modo",),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10),
+)
+_llamadas_claude = contador("upstream_llamadas_total", "Llamadas a proveedores externos", ("proveedor", "metodo"))
+_errores_claude = contador("upstream_errores_total", "Llamadas a proveedores externos que fallaron", ("proveedor", "metodo"))
+_latencia_claude = histograma("upstream_duracion_segundos", "Duración de las llamadas a proveedores externos", ("proveedor", "metodo"))
+
+
+def _marcar_cache_historial(mensajes: list) -> list:
+    """Copia de los mensajes con un breakpoint de caché en el último bloque del último mensaje"""
+    if not mensajes:
+        return mensajes
+    ultimo = mensajes[-1]
+    contenido = ultimo["content"]
+    if isinstance(contenido, str):
+        contenido = [{"type": "text", "text": contenido}]
+    if not contenido or not isinstance(contenido[-1], dict):
+        return mensajes
+    contenido = contenido[:-1] + [{**contenido[-1], "cache_control": {"type": "ephemeral"}}]
+    return mensajes[:-1] + [{"role": ultimo["role"], "content": contenido}]
+
+
+def _registrar_uso(respuesta):
+    """Acumula tokens de entrada/salida y cuántos se leyeron o escribieron en la caché"""
+    uso = respuesta.usage
+    with _uso_lock:
+        _uso["requests"] += 1
+        for campo in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+            _uso[campo] += getattr(uso, campo, None) or 0
+            _tokens.sumar(campo.replace("_tokens", ""), cantidad=getattr(uso, campo, None) or 0)
+    logger.info(
+        "uso: input=%s output=%s cache_write=%s cache_read=%s",
+        uso.input_tokens, uso.output_tokens,
+        getattr(uso, "cache_creation_input_tokens", None), getattr(uso, "cache_read_input_tokens", None)
+    )
+
+
+def _anotar_respuesta(respuesta):
+    uso = respuesta.usage
+    anotar(
+        stop_reason=respuesta.stop_reason,
+        input_tokens=uso.input_tokens,
+        output_tokens=uso.output_tokens,
+        cache_read=getattr(uso, "cache_read_input_tokens", None),
+        cache_write=getattr(uso, "cache_creation_input_tokens", None),
+    )
+
+
+async def _crear_mensaje(sesion_id, contexto_chat):
+    """messages.create medido como llamada upstream"""
+    inicio = time.perf_counter()
+    try:
+        with span("claude.messages.create"):
+            with span("contexto.preparar"):
+                parametros = _parametros_llamada(sesion_id, contexto_chat)
+            respuesta = await cliente.messages.create(**parametros)
+            _anotar_respuesta(respuesta)
+            return respuesta
+    except Exception:
+        _errores_claude.sumar("anthropic", "messages.create")
+        raise
+    finally:
+        _llamadas_claude.sumar("anthropic", "messages.create")
+        _latencia_claude.observar(time.perf_counter() - inicio, "anthropic", "messages.create")
+
+
+def estadisticas_uso() -> dict:
+    with _uso_lock:
+        return dict(_uso)
+
+# ─── LOOP DEL AGENTE ─────────────────────────
+
+def _parametros_llamada(sesion_id, contexto_chat):
+    """Parámetros comunes a cada llamada a Claude"""
+    # No mandamos todo el historial: contexto.py lo recorta al presupuesto de tokens
+    mensajes, stats = preparar_contexto(obtener_historial(sesion_id))
+    contexto_chat.sumar(stats)
+    if CACHEAR_HISTORIAL:
+        mensajes = _marcar_cache_historial(mensajes)
+    return dict(
+        model="claude-opus-4-5",
+        max_tokens=1024,
+        system=SYSTEM_CACHEADO,
+        tools=TOOLS,
+        messages=mensajes
+    )
+
+
+async def _correr_tool(nombre: str, inputs: dict) -> str:
+    """Corre una tool en el pool de tools; TOOL_TIMEOUT cuenta desde que la tool arranca
+
+    La espera en la cola del pool tiene su propio límite, TOOL_TIMEOUT_COLA: si
+    vence, la tool se saca de la cola sin correr. Un thread no se puede
+    cancelar: si la tool se pasa del tiempo se deja de esperarla, pero sigue
+    ocupando su lugar en el pool hasta que termine.
+    """
+    loop = asyncio.get_running_loop()
+    arranco = loop.create_future()
+
+    def _correr():
+        loop.call_soon_threadsafe(lambda: arranco.done() or arranco.set_result(None))
+        return ejecutar_tool(nombre, inputs)
+
+    # run_in_executor no copia el contexto: sin esto la tool quedaría fuera de la traza
+    contexto = contextvars.copy_context()
+    futuro = loop.run_in_executor(_pool_tools, contexto.run, _correr)
+    try:
+        await asyncio.wait_for(arranco, timeout=TOOL_TIMEOUT_COLA)
+    except asyncio.TimeoutError:
+        futuro.cancel()
+        logger.warning("tool %s no consiguió worker en %ss; el pool está ocupado", nombre, TOOL_TIMEOUT_COLA)
+        raise
+    try:
+        return await asyncio.wait_for(futuro, timeout=TOOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("tool %s sigue corriendo después de %ss; su thread queda ocupado", nombre, TOOL_TIMEOUT)
+        raise
+
+
+async def _ejecutar_tool(bloque) -> dict:
+    """Corre un tool_use en el pool de tools y lo devuelve como tool_result
+
+    Nunca lanza: si la tool falla o supera TOOL_TIMEOUT se devuelve un
+    tool_result con is_error, así las demás tools de la ronda siguen su curso.
+    """
+    try:
+        resultado = await _correr_tool(bloque.name, bloque.input)
+    except asyncio.TimeoutError:
+        return {
+            "type": "tool_result",
+            "tool_use_id": bloque.id,
+            "content": f"La herramienta '{bloque.name}' no respondió en {TOOL_TIMEOUT:g}s; se dejó de esperar su resultado.",
+            "is_error": True
+        }
+    except Exception as e:
+        return {
+            "type": "tool_result",
+            "tool_use_id": bloque.id,
+            "content": f"Error al ejecutar '{bloque.name}': {str(e)}",
+            "is_error": True
+        }
+    return {
+        "type": "tool_result",
+        "tool_use_id": bloque.id,
+        "content": resultado
+    }
+
+
+async def _registrar_ronda_tools(respuesta, tool_results: list, sesion_id):
+    # Agregar la respuesta del asistente con todos los tool_use
+    await agregar_mensaje_async("assistant", respuesta.content, sesion_id)
+    # Agregar TODOS los resultados en un solo mensaje de user
+    await agregar_mensaje_async("user", tool_results, sesion_id)
+
+
+async def _responder_atajo(mensaje_usuario, sesion_id):
+    """Contesta sin llamar a Claude si el mensaje es un comando simple (ver atajos.py)
+
+    Devuelve la respuesta ya guardada en el historial, o None si el mensaje
+    tiene que ir al agente. Si la tool falla, no se guarda nada y decide el modelo.
+    """
+    atajo = detectar(mensaje_usuario)
+    if atajo is None:
+        return None
+    with span("atajo", intencion=atajo.intencion, tool=atajo.tool):
+        try:
+            texto = await _correr_tool(atajo.tool, atajo.inputs)
+        except Exception as e:
+            logger.warning("atajo %s falló, sigue el agente: %s", atajo.intencion, e)
+            texto = None
+        respondido = texto is not None and concluyente(texto)
+        anotar(respondido=respondido)
+    registrar(atajo, respondido)
+    if not respondido:
+        return None
+    await agregar_mensaje_async("user", mensaje_usuario, sesion_id)
+    await agregar_mensaje_async("assistant", texto, sesion_id)
+    return texto
+
+
+# Si la respuesta final no trae texto se guarda esto: un assistant vacío haría
+# que la API rechace todos los mensajes siguientes de la sesión
+SIN_RESPUESTA = "No tengo una respuesta para eso. ¿Podés reformular la pregunta?"
+
+
+def _texto_final(respuesta) -> str:
+    texto = "".join(b.text for b in respuesta.content if b.type == "text")
+    return texto if texto.strip() else SIN_RESPUESTA
+
+
+async def chat(mensaje_usuario, sesion_id=SESION_DEFAULT):
     """Envía un mensaje y obtiene respuesta, manejando múltiples tool calls"""
-    agregar_mensaje("user", mensaje_usuario)
-
-    while True:
-        respuesta = cliente.messages.create(
-            model="claude-opus-4-5",
-            max_tokens=1024,
-            system=SYSTEM_PROMPT,
-            tools=TOOLS,
-            messages=obtener_historial()
-        )
-
-        # Si no hay más tools que ejecutar, devolvemos la respuesta final
-        if respuesta.stop_reason != "tool_use":
-            texto = respuesta.content[0].text
-            agregar_mensaje("assistant", texto)
+    # Un turno a la vez por sesión: otro chat en la misma sesión espera acá
+    async with turno(sesion_id):
+        texto = await _responder_atajo(mensaje_usuario, sesion_id)
+        if texto is not None:
             return texto
 
-        # Recolectar TODOS los tool_use de esta respuesta
-        tool_results = []
-        for bloque in respuesta.content:
-            if bloque.type == "tool_use":
-                resultado = ejecutar_tool(bloque.name, bloque.input)
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": bloque.id,
-                    "content": resultado
-                })
+        await agregar_mensaje_async("user", mensaje_usuario, sesion_id)
+        # Mientras Claude arma la primera respuesta, se traen los datos de los tickers mencionados
+        precarga = Precarga(mensaje_usuario).iniciar()
+        contexto_chat = ContextoChat()
+
+        iteraciones = 0
+        try:
+            while True:
+                iteraciones += 1
+                respuesta = await _crear_mensaje(sesion_id, contexto_chat)
+                _registrar_uso(respuesta)
+
+                # Si no hay más tools que ejecutar, devolvemos la respuesta final
+                if respuesta.stop_reason != "tool_use":
+                    texto = _texto_final(respuesta)
+                    await agregar_mensaje_async("assistant", texto, sesion_id)
+                    _iteraciones.observar(iteraciones, "chat")
+                    return texto
+
+                # Correr TODOS los tool_use de esta respuesta en paralelo;
+                # gather mantiene el orden de los bloques en los resultados
+                bloques = [b for b in respuesta.content if b.type == "tool_use"]
+                precarga.registrar_tools(bloques)
+                tool_results = await asyncio.gather(*(_ejecutar_tool(b) for b in bloques))
+
+                await _registrar_ronda_tools(respuesta, tool_results, sesion_id)
+                # El while continúa para que Claude procese los resultados
+        finally:
+            precarga.cerrar()
+            contexto_chat.cerrar(sesion_id)
+
+
+async def chat_stream(mensaje_usuario, sesion_id=SESION_DEFAULT):
+    """Igual que chat, pero va emitiendo eventos a medida que ocurren
+
+    Genera dicts con "evento" en:
+      - "texto":       fragmento de texto del modelo ("texto")
+      - "tool_inicio": empieza a correr una tool ("nombre", "input")
+      - "tool_fin":    terminó una tool ("nombre")
+      - "fin":         respuesta final completa ("respuesta"), ya persistida
+
+    Si el mensaje se contesta con un atajo, el único evento es "fin".
+    """
+    # Un turno a la vez por sesión: otro chat en la misma sesión espera acá
+    async with turno(sesion_id):
+        texto = await _responder_atajo(mensaje_usuario, sesion_id)
+        if texto is not None:
+            yield {"evento": "fin", "respuesta": texto}
+            return
+
+        await agregar_mensaje_async("user", mensaje_usuario, sesion_id)
+        precarga = Precarga(mensaje_usuario).iniciar()
+        contexto_chat = ContextoChat()
+
+        iteraciones = 0
+        try:
+            while True:
+                iteraciones += 1
+                inicio = time.perf_counter()
+                try:
+                    with span("claude.messages.stream"):
+                        async with cliente.messages.stream(**_parametros_llamada(sesion_id, contexto_chat)) as stream:
+                            async for evento in stream:
+                                if evento.type == "text":
+                                    yield {"evento": "texto", "texto": evento.text}
+                            respuesta = await stream.get_final_message()
+                        _anotar_respuesta(respuesta)
+                except Exception:
+                    _errores_claude.sumar("anthropic", "messages.stream")
+                    raise
+                finally:
+                    # Incluye el tiempo que el cliente tarda en consumir cada evento
+                    _llamadas_claude.sumar("anthropic", "messages.stream")
+                    _latencia_claude.observar(time.perf_counter() - inicio, "anthropic", "messages.stream")
+                _registrar_uso(respuesta)
+
+                if respuesta.stop_reason != "tool_use":
+                    texto = _texto_final(respuesta)
+                    await agregar_mensaje_async("assistant", texto, sesion_id)
+                    _iteraciones.observar(iteraciones, "stream")
+                    yield {"evento": "fin", "respuesta": texto}
+                    return
 
-        # Agregar la respuesta del asistente con todos los tool_use
-        agregar_mensaje("assistant", respuesta.content)
+                bloques = [b for b in respuesta.content if b.type == "tool_use"]
+                precarga.registrar_tools(bloques)
+                for bloque in bloques:
+                    yield {"evento": "tool_inicio", "nombre": bloque.name, "input": bloque.input}
 
-        # Agregar TODOS los resultados en un solo mensaje de user
-        agregar_mensaje("user", tool_results)
+                # Las tools corren en paralelo; tool_fin se emite a medida que terminan
+                tareas = [asyncio.ensure_future(_ejecutar_tool(b)) for b in bloques]
+                nombres = {id(t): b.name for t, b in zip(tareas, bloques)}
+                pendientes = set(tareas)
+                while pendientes:
+                    listas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                    for tarea in listas:
+                        yield {"evento": "tool_fin", "nombre": nombres[id(tarea)], "error": tarea.result().get("is_error", False)}
+                tool_results = [t.result() for t in tareas]
 
-        # El while continúa para que Claude procese los resultados
+                await _registrar_ronda_tools(respuesta, tool_results, sesion_id)
+        finally:
+            precarga.cerrar()
+            contexto_chat.cerrar(sesion_id)
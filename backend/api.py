@@ -1,31 +1,55 @@
 # api.py
 # Servidor FastAPI que conecta el frontend con el agente
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
-from agent import chat
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from agent import chat, chat_stream, estadisticas_uso
 from watchlist import obtener_watchlist, agregar_ticker, eliminar_ticker
-from memory import limpiar_historial
+from memory import limpiar_historial_async, migrar_legacy, SESION_DEFAULT
 from tools import obtener_precio
-import yfinance as yf
+from cache import obtener_infos, estadisticas_cache
+from indicadores import indicadores_de_tickers
+from riesgo import analizar_portfolio
+from backtest import cerrar_pool as cerrar_pool_backtest
+from contexto import estadisticas_contexto
+from registro import estadisticas_memo
+from proveedores import estadisticas_proveedor
+from prefetch import estadisticas_prefetch
+from atajos import estadisticas_atajos
+from metricas import MiddlewareMetricas, colector, exponer
+from traza import traza, pedida, autorizado, obtener_traza, listar_trazas
+from storage import listar_portfolio, guardar_posicion, eliminar_posicion
+from simbolos import validar, buscar
+from precios_live import loop_refresco, atender_cliente, resumir_cotizacion
+import fundamentales
 import json
-import os
+import uuid
 
-PORTFOLIO_FILE = os.path.join(os.path.dirname(__file__), 'portfolio.json')
+@asynccontextmanager
+async def lifespan(app):
+    # El historial global de versiones anteriores pasa a la sesión por defecto
+    migrar_legacy()
+    # Refresco de precios para los clientes conectados por /ws/precios
+    tareas = [
+        asyncio.create_task(loop_refresco()),
+        # Snapshots de fundamentales de watchlist y portfolio
+        asyncio.create_task(fundamentales.loop_refresco()),
+    ]
+    yield
+    for tarea in tareas:
+        tarea.cancel()
+    # Los procesos del backtest no terminan solos con el server
+    await asyncio.to_thread(cerrar_pool_backtest)
 
-def cargar_portfolio():
-    if os.path.exists(PORTFOLIO_FILE):
-        with open(PORTFOLIO_FILE, 'r') as f:
-            return json.load(f)
-    return []
+app = FastAPI(lifespan=lifespan)
 
-def guardar_portfolio(posiciones):
-    with open(PORTFOLIO_FILE, 'w') as f:
-        json.dump(posiciones, f)
-
-app = FastAPI()
+# Latencia por ruta para /metrics
+app.add_middleware(MiddlewareMetricas)
 
 # Permitir requests desde el frontend
 app.add_middleware(
@@ -33,10 +57,18 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# Id que genera el frontend para separar las conversaciones de cada usuario
+PATRON_SESION = r"^[A-Za-z0-9_-]{1,64}$"
+
 class Mensaje(BaseModel):
     texto: str
+    sesion_id: str = Field(SESION_DEFAULT, pattern=PATRON_SESION)
+
+class SesionBody(BaseModel):
+    sesion_id: str = Field(SESION_DEFAULT, pattern=PATRON_SESION)
 
 class TickerBody(BaseModel):
     ticker: str
@@ -51,32 +83,50 @@ def root():
     return {"status": "Agente financiero activo 🚀"}
 
 @app.post("/chat")
-def chat_endpoint(mensaje: Mensaje):
-    respuesta = chat(mensaje.texto)
+async def chat_endpoint(mensaje: Mensaje, response: Response, x_trace: Optional[str] = Header(None)):
+    # Async: mientras espera a Claude o a las tools no ocupa un worker del threadpool,
+    # que queda libre para /watchlist y /portfolio
+    # Con X-Trace: 1 se guarda el árbol de spans; se consulta en /debug/trazas/{X-Trace-Id}
+    # El texto del usuario no se guarda en la traza, solo su largo
+    with traza("chat", pedida(x_trace), sesion_id=mensaje.sesion_id, largo=len(mensaje.texto)) as traza_id:
+        respuesta = await chat(mensaje.texto, mensaje.sesion_id)
+    if traza_id:
+        response.headers["X-Trace-Id"] = traza_id
     return {"respuesta": respuesta}
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(mensaje: Mensaje, x_trace: Optional[str] = Header(None)):
+    """Igual que /chat pero por Server-Sent Events: texto a medida que llega y avisos de tools"""
+    activa = pedida(x_trace)
+    # El id va en los headers, que salen antes que el stream: se genera acá y la traza lo usa
+    traza_id = uuid.uuid4().hex[:16] if activa else None
+
+    async def eventos():
+        with traza("chat_stream", activa, traza_id=traza_id, sesion_id=mensaje.sesion_id, largo=len(mensaje.texto)):
+            try:
+                async for evento in chat_stream(mensaje.texto, mensaje.sesion_id):
+                    yield f"event: {evento['evento']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'evento': 'error', 'error': str(e)})}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if traza_id:
+        headers["X-Trace-Id"] = traza_id
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers=headers)
+
 # ─── WATCHLIST ENDPOINTS ─────────────────────
 
 @app.get("/watchlist")
 def get_watchlist():
     tickers = obtener_watchlist()
+    cotizaciones = obtener_infos(tickers)
     items = []
     for ticker in tickers:
         try:
-            activo = yf.Ticker(ticker)
-            info = activo.info
-            precio = info.get("currentPrice") or info.get("regularMarketPrice") or 0
-            apertura = info.get("open") or info.get("regularMarketOpen") or precio
-            variacion = ((precio - apertura) / apertura * 100) if apertura else 0
-            nombre = info.get("shortName") or ticker
-            moneda = info.get("currency", "USD")
-            items.append({
-                "ticker": ticker,
-                "nombre": nombre,
-                "precio": round(precio, 2),
-                "variacion": round(variacion, 2),
-                "moneda": moneda
-            })
+            info = cotizaciones[ticker.upper()]["info"]
+            if info is None:
+                raise ValueError(cotizaciones[ticker.upper()]["error"])
+            items.append(resumir_cotizacion(ticker, info))
         except:
             items.append({
                 "ticker": ticker,
@@ -87,6 +137,16 @@ def get_watchlist():
             })
     return {"items": items}
 
+@app.get("/watchlist/tecnico")
+def get_watchlist_tecnico():
+    """Indicadores técnicos de toda la watchlist, calculados en una sola pasada"""
+    return {"items": indicadores_de_tickers(obtener_watchlist())}
+
+@app.get("/watchlist/fundamentales")
+def get_watchlist_fundamentales():
+    """Sector, market cap, P/E, etc. de la watchlist, leídos del snapshot local (sin esperar a la red)"""
+    return {"items": fundamentales.obtener_lote(obtener_watchlist())}
+
 @app.post("/watchlist")
 def add_to_watchlist(body: TickerBody):
     resultado = agregar_ticker(body.ticker)
@@ -97,19 +157,26 @@ def remove_from_watchlist(ticker: str):
     resultado = eliminar_ticker(ticker)
     return {"mensaje": resultado}
 
+@app.websocket("/ws/precios")
+async def ws_precios(websocket: WebSocket):
+    """Push de cotizaciones de watchlist y portfolio: solo se mandan los tickers que cambiaron"""
+    await atender_cliente(websocket)
+
 # ─── PORTFOLIO ENDPOINTS ─────────────────────
 
 @app.get("/portfolio")
 def get_portfolio():
-    posiciones = cargar_portfolio()
+    posiciones = listar_portfolio()
     items = []
     total_invertido = 0
     total_actual = 0
+    cotizaciones = obtener_infos([pos['ticker'] for pos in posiciones])
 
     for pos in posiciones:
         try:
-            activo = yf.Ticker(pos['ticker'])
-            info = activo.info
+            info = cotizaciones[pos['ticker'].upper()]["info"]
+            if info is None:
+                raise ValueError(cotizaciones[pos['ticker'].upper()]["error"])
             precio_actual = info.get("currentPrice") or info.get("regularMarketPrice") or 0
             nombre = info.get("shortName") or pos['ticker']
             moneda = info.get("currency", "USD")
@@ -157,48 +224,115 @@ def get_portfolio():
         "ganancia_total_pct": round(ganancia_total_pct, 2)
     }
 
+@app.get("/portfolio/riesgo")
+def get_portfolio_riesgo(benchmark: Optional[str] = None):
+    """Volatilidad, correlaciones, beta, drawdown y VaR/CVaR del portfolio sobre el historial local"""
+    return analizar_portfolio(benchmark=benchmark)
+
+@app.get("/portfolio/fundamentales")
+def get_portfolio_fundamentales():
+    """Igual que /watchlist/fundamentales, para los tickers del portfolio"""
+    tickers = list(dict.fromkeys(p["ticker"] for p in listar_portfolio()))
+    return {"items": fundamentales.obtener_lote(tickers)}
+
 @app.post("/portfolio")
 def add_posicion(posicion: Posicion):
     ticker = posicion.ticker.upper()
-    try:
-        activo = yf.Ticker(ticker)
-        info = activo.info
-        if not info.get("currentPrice") and not info.get("regularMarketPrice"):
-            return {"error": f"Ticker '{ticker}' no encontrado"}
-    except:
-        return {"error": f"Error al validar '{ticker}'"}
-
-    posiciones = cargar_portfolio()
-    # Si ya existe, actualizar
-    for pos in posiciones:
-        if pos['ticker'] == ticker:
-            pos['cantidad'] = posicion.cantidad
-            pos['precio_compra'] = posicion.precio_compra
-            guardar_portfolio(posiciones)
-            return {"mensaje": f"{ticker} actualizado en el portfolio"}
-
-    posiciones.append({
-        "ticker": ticker,
-        "cantidad": posicion.cantidad,
-        "precio_compra": posicion.precio_compra
-    })
-    guardar_portfolio(posiciones)
+    # El índice de símbolos evita ir a la red para tickers ya conocidos (o typos ya vistos)
+    if not validar(ticker):
+        return {"error": f"Ticker '{ticker}' no encontrado"}
+
+    # Si ya existe, se actualiza (upsert atómico)
+    if not guardar_posicion(ticker, posicion.cantidad, posicion.precio_compra):
+        return {"mensaje": f"{ticker} actualizado en el portfolio"}
     return {"mensaje": f"{ticker} agregado al portfolio"}
 
 @app.delete("/portfolio/{ticker}")
 def delete_posicion(ticker: str):
     ticker = ticker.upper()
-    posiciones = cargar_portfolio()
-    nuevas = [p for p in posiciones if p['ticker'] != ticker]
-    if len(nuevas) == len(posiciones):
+    if not eliminar_posicion(ticker):
         return {"error": f"{ticker} no está en el portfolio"}
-    guardar_portfolio(nuevas)
     return {"mensaje": f"{ticker} eliminado del portfolio"}
 
+# ─── SÍMBOLOS ────────────────────────────────
+
+@app.get("/simbolos")
+def get_simbolos(q: str = ""):
+    """Autocompletado de tickers por prefijo, alias o nombre, sin consultar la red"""
+    return {"items": buscar(q)}
+
+# ─── CACHÉ ───────────────────────────────────
+
+@app.get("/cache")
+def get_cache():
+    """Hits/misses y ocupación de la caché de cotizaciones"""
+    return estadisticas_cache()
+
+@app.get("/stats")
+def get_stats():
+    """Contadores acumulados desde que arrancó el servidor"""
+    return {
+        "cache": estadisticas_cache(),
+        "memo_tools": estadisticas_memo(),
+        "contexto": estadisticas_contexto(),
+        "tokens": estadisticas_uso(),
+        "proveedor": estadisticas_proveedor(),
+        "prefetch": estadisticas_prefetch(),
+        "atajos": estadisticas_atajos(),
+    }
+
+@colector
+def _metricas_de_stats():
+    """Los contadores que ya llevan cache, registro y contexto, leídos en cada scrape"""
+    cache = estadisticas_cache()
+    memo = estadisticas_memo()
+    contexto = estadisticas_contexto()
+    return [
+        ("cache_hits_total", "counter", "Lecturas servidas desde la caché",
+         {(("cache", "cotizaciones"),): cache["hits"], (("cache", "memo_tools"),): memo["hits"]}),
+        ("cache_misses_total", "counter", "Lecturas que no estaban en la caché",
+         {(("cache", "cotizaciones"),): cache["misses"], (("cache", "memo_tools"),): memo["misses"]}),
+        ("cache_hit_ratio", "gauge", "Proporción de hits desde que arrancó el proceso",
+         {(("cache", "cotizaciones"),): cache["hit_ratio"], (("cache", "memo_tools"),): memo["hit_ratio"]}),
+        ("cache_entradas", "gauge", "Entradas ocupadas en la caché",
+         {(("cache", "cotizaciones"),): cache["entradas"], (("cache", "memo_tools"),): memo["entradas"]}),
+        ("upstream_coalescidos_total", "counter", "Pedidos que reusaron una descarga ya en vuelo",
+         {(): cache["coalescidos"]["compartidas"]}),
+        ("contexto_tokens_total", "counter", "Tokens estimados del historial, antes y después de recortar",
+         {(("etapa", "original"),): contexto["tokens_originales"], (("etapa", "enviado"),): contexto["tokens_enviados"]}),
+    ]
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ─── TRAZAS ──────────────────────────────────
+
+def _exigir_token_debug(token: Optional[str]):
+    # 404 y no 401: sin el token las rutas de debug no se anuncian
+    if not autorizado(token):
+        raise HTTPException(status_code=404)
+
+@app.get("/debug/trazas")
+def get_trazas(x_debug_token: Optional[str] = Header(None)):
+    """Últimas trazas guardadas (pedidas con el header X-Trace: 1 o con TRAZAS=1)"""
+    _exigir_token_debug(x_debug_token)
+    return {"items": listar_trazas()}
+
+@app.get("/debug/trazas/{traza_id}")
+def get_traza(traza_id: str, x_debug_token: Optional[str] = Header(None)):
+    """Árbol de spans de un request: llamadas a Claude, tools, proveedor e historial"""
+    _exigir_token_debug(x_debug_token)
+    encontrada = obtener_traza(traza_id)
+    if encontrada is None:
+        return {"error": f"No hay una traza {traza_id} (se guardan las últimas)"}
+    return encontrada
+
 # ─── HISTORIAL ───────────────────────────────
 
 @app.post("/reset")
-def reset_historial():
-    """Borra el historial de conversación"""
-    limpiar_historial()
+async def reset_historial(body: Optional[SesionBody] = None):
+    """Borra el historial de conversación de una sesión (si está respondiendo, al terminar el turno)"""
+    await limpiar_historial_async(body.sesion_id if body else SESION_DEFAULT)
     return {"mensaje": "Historial borrado. ¡Nueva conversación lista! 🧹"}
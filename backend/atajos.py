@@ -0,0 +1,119 @@
+# atajos.py
+# Router de intenciones sin modelo para los comandos más frecuentes
+#
+# "precio de AAPL", "¿qué tengo en mi watchlist?" o "agregá MSFT" cuestan dos
+# vueltas completas a Claude (pedir la tool y después resumirla). Acá se
+# reconocen con patrones fijos y se contestan directo con la tool, en
+# milisegundos. Ante cualquier duda (otra redacción, más de un activo, un
+# nombre que no resuelve exacto) no hay atajo y el mensaje va al agente.
+
+import os
+import re
+import threading
+import time
+from typing import NamedTuple, Optional
+from metricas import contador
+from simbolos import exacto, normalizar
+from storage import en_watchlist, es_invalido
+
+ATAJOS_ACTIVO = os.getenv("ATAJOS", "1") == "1"
+# Los mensajes largos casi nunca son un comando simple
+MAX_LARGO = 80
+
+_ACTIVO = r"(?:(?:el|la|los)\s+)?(?P<activo>[a-z0-9$^&.\- ]+?)"
+_WATCHLIST = r"(?:mi|la)\s+watchlist"
+_FORMA_TICKER = re.compile(r"\$(\^?[A-Z][A-Z0-9.]{0,5}(?:-[A-Z]{2,4})?)")
+
+# (intención, tool, patrón sobre el texto normalizado y sin signos en los bordes)
+_PATRONES = [
+    ("precio", "obtener_precio", re.compile(
+        r"(?:(?:cual es|decime|dame|pasame|mostrame)\s+)?(?:el\s+)?(?:precio|cotizacion)\s+(?:actual\s+)?"
+        r"(?:(?:de|del)\s+)?" + _ACTIVO + r"(?:\s+hoy)?"
+    )),
+    ("precio", "obtener_precio", re.compile(
+        r"(?:a\s+)?cuanto\s+(?:esta|vale|cotiza)\s+" + _ACTIVO + r"(?:\s+hoy)?"
+    )),
+    ("ver_watchlist", "ver_watchlist", re.compile(
+        r"(?:que\s+(?:tengo|hay)\s+en\s+|(?:ver|mostrame|mostra|dame)\s+|cual es\s+)?" + _WATCHLIST + r"|watchlist"
+    )),
+    ("agregar", "agregar_a_watchlist", re.compile(
+        r"(?:agrega|agregame|agregar|suma|sumame|anadi|segui)\s+" + _ACTIVO + r"(?:\s+(?:a|en)\s+" + _WATCHLIST + r")?"
+    )),
+    ("eliminar", "eliminar_de_watchlist", re.compile(
+        r"(?:saca|sacame|sacar|elimina|eliminar|borra|borrar|quita|quitar|deja de seguir(?:\s+a)?)\s+" + _ACTIVO
+        + r"(?:\s+de\s+" + _WATCHLIST + r")?"
+    )),
+]
+
+_stats = {"mensajes": 0, "respondidos": 0, "derivados": 0, "por_intencion": {}}
+_stats_lock = threading.Lock()
+_atajos_metrica = contador(
+    "atajos_total", "Mensajes que matchearon un atajo, según si se respondieron sin el modelo",
+    ("intencion", "resultado"),
+)
+
+
+class Atajo(NamedTuple):
+    intencion: str
+    tool: str
+    inputs: dict
+
+
+def _ticker(activo: str, intencion: str, texto: str) -> Optional[str]:
+    """El ticker del activo si no hay dudas, o None para que decida el modelo
+
+    Para sacar, solo un ticker que ya esté en la watchlist. Para precio o
+    agregar, un símbolo del índice o alias, o un cashtag ($AAPL) escrito tal
+    cual: una palabra suelta en mayúsculas ("TODO", "ESO") no alcanza.
+    """
+    activo = activo.lstrip("$")
+    ticker = exacto(activo)
+    if intencion == "eliminar":
+        ticker = ticker or activo.upper()
+        return ticker if en_watchlist(ticker) else None
+    if ticker is not None:
+        return ticker
+    escrito = re.search(r"(?<![\w^$])\$" + re.escape(activo.upper()) + r"(?![\w-])", texto)
+    forma = _FORMA_TICKER.fullmatch(escrito.group()) if escrito else None
+    if forma and not es_invalido(forma.group(1), time.time()):
+        return forma.group(1)
+    return None
+
+
+def detectar(texto: str) -> Optional[Atajo]:
+    """El atajo que corresponde al mensaje, o None si no hay uno seguro"""
+    if not ATAJOS_ACTIVO:
+        return None
+    with _stats_lock:
+        _stats["mensajes"] += 1
+    if len(texto) > MAX_LARGO:
+        return None
+
+    norm = normalizar(texto).strip(" ?!.,;:")
+    for intencion, tool, patron in _PATRONES:
+        coincidencia = patron.fullmatch(norm)
+        if coincidencia is None:
+            continue
+        if "activo" not in patron.groupindex:
+            return Atajo(intencion, tool, {})
+        ticker = _ticker(coincidencia["activo"], intencion, texto)
+        if ticker is not None:
+            return Atajo(intencion, tool, {"ticker": ticker})
+    return None
+
+
+def registrar(atajo: Atajo, respondido: bool):
+    """Cuenta un atajo detectado: respondido sin el modelo o derivado al agente"""
+    resultado = "respondido" if respondido else "derivado"
+    with _stats_lock:
+        _stats["respondidos" if respondido else "derivados"] += 1
+        por_intencion = _stats["por_intencion"]
+        por_intencion[atajo.intencion] = por_intencion.get(atajo.intencion, 0) + respondido
+    _atajos_metrica.sumar(atajo.intencion, resultado)
+
+
+def estadisticas_atajos() -> dict:
+    with _stats_lock:
+        stats = {**_stats, "por_intencion": dict(_stats["por_intencion"])}
+    stats["tasa"] = round(stats["respondidos"] / stats["mensajes"], 4) if stats["mensajes"] else 0.0
+    return stats
@@ -0,0 +1,201 @@
+# backtest.py
+# Backtesting vectorizado de estrategias simples sobre el historial diario local
+#
+# Las señales, posiciones y curvas de capital se calculan para todos los
+# tickers a la vez sobre matrices (tickers × bars), sin recorrer bar por bar.
+# Para barrer una grilla de parámetros, las combinaciones se reparten en un
+# pool de procesos (el cálculo es CPU puro y el GIL no lo deja escalar en threads).
+
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import numpy as np
+import pandas as pd
+from historial_precios import obtener_barras_lote, CIERRE, FECHA, PERIODO_INICIAL
+from indicadores import alinear, sma, rsi
+
+ANIOS_DEFAULT = int(os.getenv("BACKTEST_ANIOS", "5"))
+# Costo por cada cambio de posición (comisión + spread), como fracción del monto
+COSTO_OPERACION = float(os.getenv("BACKTEST_COSTO", "0.001"))
+MAX_PROCESOS = int(os.getenv("BACKTEST_PROCESOS", str(os.cpu_count() or 1)))
+# Por debajo de esta cantidad de combinaciones no vale la pena mandar trabajo a otros procesos
+MIN_COMBINACIONES_POOL = 8
+DIAS_POR_ANIO = 252
+
+ESTRATEGIAS = {
+    # Comprado mientras la media rápida está arriba de la lenta
+    "cruce_sma": {
+        "parametros": ("rapida", "lenta"),
+        "default": (20, 50),
+        "grilla": [(r, l) for r, l in product((5, 10, 20, 50), (50, 100, 150, 200)) if r < l],
+    },
+    # Compra cuando el RSI baja de `entrada` y vende cuando supera `salida`
+    "rsi": {
+        "parametros": ("entrada", "salida"),
+        "default": (30, 70),
+        "grilla": list(product((20, 25, 30, 35), (60, 65, 70, 75, 80))),
+    },
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _anios_periodo(periodo: str):
+    """Años que trae la primera descarga del historial ("5y" → 5); None si no es un período en años"""
+    return int(periodo[:-1]) if periodo.endswith("y") and periodo[:-1].isdigit() else None
+
+
+# El historial local no se completa hacia atrás: pedir más años que estos no trae más datos
+MAX_ANIOS = _anios_periodo(PERIODO_INICIAL)
+
+
+# ─── SEÑALES ─────────────────────────────────
+
+def posiciones_cruce_sma(cierres: np.ndarray, rapida: int, lenta: int) -> np.ndarray:
+    """1 donde la SMA rápida está arriba de la lenta, 0 en el resto (y mientras no hay datos)"""
+    return (sma(cierres, rapida) > sma(cierres, lenta)).astype(np.float64)
+
+
+def posiciones_rsi(cierres: np.ndarray, entrada: float, salida: float) -> np.ndarray:
+    """Entra con RSI < entrada y sale con RSI > salida; entre medio mantiene el estado anterior"""
+    valores = rsi(cierres)
+    estado = np.where(valores < entrada, 1.0, np.where(valores > salida, 0.0, np.nan))
+    # El "mantener" es un forward-fill del último cambio de estado, por fila
+    return pd.DataFrame(estado.T).ffill().fillna(0).to_numpy().T
+
+
+_SENALES = {"cruce_sma": posiciones_cruce_sma, "rsi": posiciones_rsi}
+
+
+# ─── MÉTRICAS ────────────────────────────────
+
+def _metricas(retornos: np.ndarray, posiciones: np.ndarray, costo: float) -> dict:
+    """Curva de capital y métricas por fila; la señal del día t se opera en t+1"""
+    en_posicion = np.zeros_like(posiciones)
+    en_posicion[:, 1:] = posiciones[:, :-1]
+    validos = ~np.isnan(retornos)
+    operaciones = np.abs(np.diff(en_posicion, axis=1, prepend=0))
+    diarios = np.where(validos, en_posicion * np.nan_to_num(retornos), 0) - costo * operaciones
+
+    curva = np.cumprod(1 + diarios, axis=1)
+    picos = np.maximum(np.maximum.accumulate(curva, axis=1), 1.0)
+    dias = np.maximum(validos.sum(axis=1), 1)
+    media = diarios.sum(axis=1) / dias
+    desvio = np.sqrt(np.maximum((diarios ** 2).sum(axis=1) / dias - media ** 2, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(desvio > 0, media / desvio * np.sqrt(DIAS_POR_ANIO), np.nan)
+
+    return {
+        "retorno_total": curva[:, -1] - 1,
+        "cagr": curva[:, -1] ** (DIAS_POR_ANIO / dias) - 1,
+        "sharpe": sharpe,
+        "max_drawdown": np.min(curva / picos - 1, axis=1),
+        "operaciones": (np.diff(en_posicion, axis=1, prepend=0) > 0).sum(axis=1),
+        "exposicion": (en_posicion * validos).sum(axis=1) / dias,
+    }
+
+
+def _retornos(cierres: np.ndarray) -> np.ndarray:
+    retornos = np.full_like(cierres, np.nan)
+    retornos[:, 1:] = cierres[:, 1:] / cierres[:, :-1] - 1
+    return retornos
+
+
+def _evaluar_lote(estrategia: str, cierres: np.ndarray, combinaciones: list, costo: float) -> list:
+    """Métricas de cada combinación para todos los tickers (corre en los procesos del pool)"""
+    retornos = _retornos(cierres)
+    senal = _SENALES[estrategia]
+    return [_metricas(retornos, senal(cierres, *combinacion), costo) for combinacion in combinaciones]
+
+
+def _evaluar(estrategia: str, cierres: np.ndarray, combinaciones: list, costo: float) -> list:
+    """Reparte las combinaciones en el pool de procesos si son suficientes"""
+    global _pool
+    if MAX_PROCESOS <= 1 or len(combinaciones) < MIN_COMBINACIONES_POOL:
+        return _evaluar_lote(estrategia, cierres, combinaciones, costo)
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el servidor tiene threads vivos y hacer fork con threads no es seguro
+            _pool = ProcessPoolExecutor(MAX_PROCESOS, mp_context=multiprocessing.get_context("spawn"))
+        pool = _pool
+    tamano = math.ceil(len(combinaciones) / MAX_PROCESOS)
+    lotes = [combinaciones[i:i + tamano] for i in range(0, len(combinaciones), tamano)]
+    futuros = [pool.submit(_evaluar_lote, estrategia, cierres, lote, costo) for lote in lotes]
+    return [m for futuro in futuros for m in futuro.result()]
+
+
+def cerrar_pool():
+    """Termina los procesos del pool (al apagar el servidor)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ─── API ─────────────────────────────────────
+
+def _resumen(metricas: dict, fila: int) -> dict:
+    def _r(valor, decimales=4):
+        return None if np.isnan(valor) else round(float(valor), decimales)
+    return {
+        "retorno_total": _r(metricas["retorno_total"][fila]),
+        "cagr": _r(metricas["cagr"][fila]),
+        "sharpe": _r(metricas["sharpe"][fila], 2),
+        "max_drawdown": _r(metricas["max_drawdown"][fila]),
+        "operaciones": int(metricas["operaciones"][fila]),
+        "exposicion": _r(metricas["exposicion"][fila], 3),
+    }
+
+
+def backtest(tickers: list, estrategia: str, parametros: tuple = None, optimizar: bool = False,
+             anios: int = None, costo: float = None) -> dict:
+    """Corre la estrategia sobre los últimos `anios` de cada ticker (como mucho MAX_ANIOS)
+
+    Con optimizar=True barre la grilla de ESTRATEGIAS[estrategia] y devuelve,
+    por ticker, la mejor combinación según Sharpe. Devuelve {ticker: dict}
+    con las métricas de la estrategia y de comprar y mantener y las fechas
+    simuladas ("desde"/"hasta"), o {ticker: {"error": str}} si no hay historial suficiente.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estrategia desconocida: {estrategia}. Opciones: {', '.join(ESTRATEGIAS)}")
+    definicion = ESTRATEGIAS[estrategia]
+    costo = COSTO_OPERACION if costo is None else costo
+    combinaciones = definicion["grilla"] if optimizar else [tuple(parametros or definicion["default"])]
+
+    anios = min(anios or ANIOS_DEFAULT, MAX_ANIOS or math.inf)
+    barras = obtener_barras_lote(tickers, dias=int(anios * DIAS_POR_ANIO))
+    validos = [t for t, b in barras.items() if not isinstance(b, Exception) and b.shape[1] > 50]
+    resultado = {
+        t: {"error": str(b) if isinstance(b, Exception) else "historial insuficiente"}
+        for t, b in barras.items() if t not in validos
+    }
+    if validos:
+        cierres = alinear([barras[t][CIERRE] for t in validos])
+        por_combinacion = _evaluar(estrategia, cierres, combinaciones, costo)
+        # Comprar y mantener = estar siempre comprado, sin costos
+        mantener = _metricas(_retornos(cierres), np.ones_like(cierres), 0)
+
+        # Mejor combinación por ticker según Sharpe (NaN al final)
+        sharpes = np.vstack([m["sharpe"] for m in por_combinacion])
+        mejores = np.argmax(np.nan_to_num(sharpes, nan=-np.inf), axis=0)
+
+        for fila, ticker in enumerate(validos):
+            indice = int(mejores[fila])
+            resultado[ticker] = {
+                "estrategia": estrategia,
+                "parametros": dict(zip(definicion["parametros"], combinaciones[indice])),
+                "bars": int(np.count_nonzero(~np.isnan(cierres[fila]))),
+                "desde": str(np.datetime64(int(barras[ticker][FECHA, 0]), "D")),
+                "hasta": str(np.datetime64(int(barras[ticker][FECHA, -1]), "D")),
+                **_resumen(por_combinacion[indice], fila),
+                "comprar_y_mantener": _resumen(mantener, fila),
+            }
+            if optimizar:
+                resultado[ticker]["combinaciones_probadas"] = len(combinaciones)
+    return {t: resultado[t] for t in barras}
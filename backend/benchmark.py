@@ -0,0 +1,233 @@
+# benchmark.py
+# Benchmark de carga y latencia de la API con mercado y Claude simulados
+#
+# Levanta api.app en proceso (httpx + ASGITransport, sin red), con el
+# proveedor de mercado replay y un cliente de Anthropic falso, ambos con
+# latencia configurable. Para cada endpoint y nivel de concurrencia mide
+# p50/p95/p99, throughput, errores y cuántas llamadas upstream hizo, y
+# guarda todo en JSON para comparar corridas.
+#
+# Uso:
+#   python benchmark.py
+#   python benchmark.py --concurrencia 1 8 32 --requests 200 --latencia-mercado 80 --latencia-claude 600
+#   python benchmark.py --frio --comparar benchmarks/anterior.json
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Todo lo que lee variables de entorno al importarse tiene que verlas antes
+_TMP = Path(tempfile.mkdtemp(prefix="benchmark-"))
+os.environ["PROVEEDOR_MERCADO"] = "replay"
+os.environ["DB_PATH"] = str(_TMP / "agente.db")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+import httpx
+import numpy as np
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+
+import agent
+import api
+import historial_precios
+import memory
+import storage
+from cache import limpiar_cache
+from proveedores import ReplayProveedor, usar_proveedor
+
+RESULTADOS_DIR = Path(__file__).parent / "benchmarks"
+TICKERS = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "MELI", "SPY", "QQQ",
+           "KO", "DIS", "NFLX", "YPF", "GGAL", "GLOB", "JPM", "XOM", "BTC-USD", "ETH-USD"]
+
+
+# ─── CLAUDE SIMULADO ─────────────────────────
+
+class _MensajesSimulados:
+    """messages.create falso: pide obtener_precio para el ticker del mensaje y después resume"""
+
+    def __init__(self, latencia_ms: float):
+        self.latencia_ms = latencia_ms
+        self.llamadas = 0
+
+    async def create(self, **parametros):
+        self.llamadas += 1
+        await asyncio.sleep(self.latencia_ms / 1000)
+        ultimo = parametros["messages"][-1]["content"]
+        entrada = len(json.dumps(parametros["messages"], default=str)) // 4
+        uso = Usage(input_tokens=entrada, output_tokens=60)
+
+        # El último mensaje llega como bloques (agent.py le agrega el breakpoint de caché)
+        bloques = [{"type": "text", "text": ultimo}] if isinstance(ultimo, str) else ultimo
+        resultado = next((b["content"] for b in bloques if b.get("type") == "tool_result"), None)
+
+        # Ronda 1: el modelo pide la tool; ronda 2 (ya con el tool_result): responde
+        if resultado is None:
+            texto = " ".join(b.get("text", "") for b in bloques)
+            ticker = (re.findall(r"\b[A-Z][A-Z0-9.-]{0,9}\b", texto) or ["SPY"])[-1]
+            bloque = ToolUseBlock(type="tool_use", id=f"toolu_{self.llamadas}", name="obtener_precio",
+                                  input={"ticker": ticker})
+            return Message(id=f"msg_{self.llamadas}", type="message", role="assistant", model=parametros["model"],
+                           content=[bloque], stop_reason="tool_use", usage=uso)
+        texto = f"Acá tenés la cotización:\n{resultado}"
+        return Message(id=f"msg_{self.llamadas}", type="message", role="assistant", model=parametros["model"],
+                       content=[TextBlock(type="text", text=texto)], stop_reason="end_turn", usage=uso)
+
+
+class ClaudeSimulado:
+    def __init__(self, latencia_ms: float):
+        self.messages = _MensajesSimulados(latencia_ms)
+
+
+# ─── ESCENARIO ───────────────────────────────
+
+def preparar(args) -> ClaudeSimulado:
+    """Datos de prueba en directorios temporales y backends simulados"""
+    historial_precios.HISTORIAL_DIR = _TMP / "precios"
+    memory.HISTORIALES_DIR = _TMP / "historiales"
+    usar_proveedor(ReplayProveedor(latencia_ms=args.latencia_mercado, jitter_ms=args.latencia_mercado / 4))
+    claude = ClaudeSimulado(args.latencia_claude)
+    agent.cliente = claude
+
+    for ticker in TICKERS[:args.watchlist]:
+        storage.agregar_watchlist(ticker)
+    for i in range(args.posiciones):
+        storage.guardar_posicion(TICKERS[i % len(TICKERS)] if i < len(TICKERS) else f"SIM{i}", 10 + i, 100)
+    return claude
+
+
+def _pedido(endpoint: str, i: int) -> dict:
+    if endpoint == "/chat":
+        ticker = TICKERS[i % len(TICKERS)]
+        # Una pregunta abierta: los comandos simples los contesta atajos.py sin pasar por Claude
+        return {"method": "POST", "url": "/chat",
+                "json": {"texto": f"¿Cómo viene {ticker} esta semana?", "sesion_id": f"bench-{i % 50}"}}
+    return {"method": "GET", "url": endpoint}
+
+
+def _contadores_upstream(claude: ClaudeSimulado) -> dict:
+    proveedor = api.estadisticas_proveedor()
+    return {
+        "mercado_info": proveedor.get("info", {}).get("llamadas", 0),
+        "mercado_historial": proveedor.get("historial", {}).get("llamadas", 0),
+        "mercado_errores": sum(v.get("errores", 0) for v in proveedor.values() if isinstance(v, dict)),
+        "claude": claude.messages.llamadas,
+    }
+
+
+async def medir(cliente: httpx.AsyncClient, claude, endpoint: str, concurrencia: int, total: int) -> dict:
+    """Manda `total` pedidos con a lo sumo `concurrencia` en vuelo y resume las latencias"""
+    latencias = []
+    errores = 0
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def uno(i):
+        nonlocal errores
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await cliente.request(**_pedido(endpoint, i))
+                if respuesta.status_code >= 400:
+                    errores += 1
+            except Exception:
+                errores += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    antes = _contadores_upstream(claude)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(uno(i) for i in range(total)))
+    duracion = time.perf_counter() - inicio
+    despues = _contadores_upstream(claude)
+
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    return {
+        "endpoint": endpoint,
+        "concurrencia": concurrencia,
+        "requests": total,
+        "errores": errores,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(max(latencias), 2),
+        "throughput_rps": round(total / duracion, 2),
+        "upstream": {k: despues[k] - antes[k] for k in antes},
+    }
+
+
+async def correr(args) -> list:
+    claude = preparar(args)
+    transporte = httpx.ASGITransport(app=api.app)
+    resultados = []
+    async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=120) as cliente:
+        for endpoint in args.endpoints:
+            # Un pedido de calentamiento: baja historiales y llena el índice de símbolos
+            await cliente.request(**_pedido(endpoint, 0))
+            for concurrencia in args.concurrencia:
+                if args.frio:
+                    limpiar_cache()
+                total = args.requests_chat if endpoint == "/chat" else args.requests
+                fila = await medir(cliente, claude, endpoint, concurrencia, max(total, concurrencia))
+                resultados.append(fila)
+                print(
+                    f"{endpoint:<12} c={concurrencia:<4} p50={fila['p50_ms']:>8.1f}ms p95={fila['p95_ms']:>8.1f}ms "
+                    f"p99={fila['p99_ms']:>8.1f}ms {fila['throughput_rps']:>8.1f} req/s "
+                    f"errores={fila['errores']} upstream={fila['upstream']}"
+                )
+    return resultados
+
+
+def comparar(actual: list, archivo: Path):
+    """Imprime la variación de p50/p95 contra una corrida anterior"""
+    with open(archivo) as f:
+        anterior = {(r["endpoint"], r["concurrencia"]): r for r in json.load(f)["resultados"]}
+    print(f"\nComparación contra {archivo}:")
+    for fila in actual:
+        base = anterior.get((fila["endpoint"], fila["concurrencia"]))
+        if base is None:
+            continue
+        cambios = " ".join(
+            f"{m}={(fila[m] - base[m]) / base[m] * 100:+.1f}%" if base[m] else f"{m}=n/a"
+            for m in ("p50_ms", "p95_ms", "throughput_rps")
+        )
+        print(f"{fila['endpoint']:<12} c={fila['concurrencia']:<4} {cambios}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga y latencia de la API con mercado y Claude simulados")
+    parser.add_argument("--endpoints", nargs="+", default=["/watchlist", "/portfolio", "/chat"])
+    parser.add_argument("--concurrencia", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="pedidos por nivel para /watchlist y /portfolio")
+    parser.add_argument("--requests-chat", type=int, default=100, help="pedidos por nivel para /chat")
+    parser.add_argument("--latencia-mercado", type=float, default=50, help="ms por llamada al proveedor de mercado")
+    parser.add_argument("--latencia-claude", type=float, default=500, help="ms por messages.create")
+    parser.add_argument("--watchlist", type=int, default=10, help="tickers en la watchlist")
+    parser.add_argument("--posiciones", type=int, default=20, help="posiciones en el portfolio")
+    parser.add_argument("--frio", action="store_true", help="vaciar la caché de cotizaciones antes de cada nivel")
+    parser.add_argument("--salida", type=Path, help="archivo JSON de resultados (por defecto benchmarks/<fecha>.json)")
+    parser.add_argument("--comparar", type=Path, help="resultado anterior contra el que comparar")
+    args = parser.parse_args()
+
+    resultados = asyncio.run(correr(args))
+
+    salida = args.salida or RESULTADOS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w") as f:
+        json.dump({
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "parametros": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+            "resultados": resultados,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados en {salida}")
+
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
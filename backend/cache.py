@@ -0,0 +1,148 @@
+# cache.py
+# Caché compartida de cotizaciones (el .info del proveedor de mercado) con TTL y LRU
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from coalescer import vuelos
+from proveedores import obtener_proveedor
+
+# TTL en segundos según el tipo de dato que se lee del .info
+# Las cotizaciones cambian todo el tiempo; los fundamentales casi nunca
+TTL_POR_TIPO = {
+    "precio": float(os.getenv("CACHE_TTL_PRECIO", "30")),
+    "fundamental": float(os.getenv("CACHE_TTL_FUNDAMENTAL", "21600")),
+}
+MAX_ENTRADAS = int(os.getenv("CACHE_MAX_TICKERS", "512"))
+# Cuántos tickers se piden en paralelo al proveedor en los pedidos en lote
+MAX_CONCURRENCIA_LOTE = int(os.getenv("CACHE_MAX_CONCURRENCIA_LOTE", "8"))
+
+
+class TTLCache:
+    """Caché LRU acotada donde cada lectura decide qué antigüedad acepta"""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()   # clave -> (timestamp, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave, ttl: float, contar: bool = True):
+        """Devuelve el valor si existe y tiene menos de `ttl` segundos, si no None"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and time.monotonic() - entrada[0] < ttl:
+                self._datos.move_to_end(clave)
+                self.hits += contar
+                return entrada[1]
+            self.misses += contar
+            return None
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic(), valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave=None):
+        with self._lock:
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_cache_info = TTLCache(MAX_ENTRADAS)
+
+
+def _descargar_info(ticker: str, ttl: float) -> dict:
+    # Volvemos a mirar la caché: puede que otra descarga haya terminado justo antes
+    info = _cache_info.obtener(ticker, ttl, contar=False)
+    if info is not None:
+        return info
+    info = obtener_proveedor().info(ticker)
+    _cache_info.guardar(ticker, info)
+    return info
+
+
+def obtener_info(ticker: str, tipo: str = "precio", max_edad: float = None) -> dict:
+    """Devuelve el .info de un ticker, yendo al proveedor solo si el dato cacheado está vencido
+
+    `max_edad` (segundos) reemplaza el TTL del tipo cuando hace falta un dato más fresco.
+    Si otro thread ya está descargando el mismo ticker, se espera esa descarga.
+    """
+    ticker = ticker.upper()
+    ttl = TTL_POR_TIPO[tipo] if max_edad is None else max_edad
+    info = _cache_info.obtener(ticker, ttl)
+    if info is not None:
+        return info
+    return vuelos.hacer(("info", ticker), _descargar_info, ticker, ttl)
+
+
+async def obtener_info_async(ticker: str, tipo: str = "precio", max_edad: float = None) -> dict:
+    """Igual que obtener_info pero para corrutinas: la descarga corre en un thread"""
+    ticker = ticker.upper()
+    ttl = TTL_POR_TIPO[tipo] if max_edad is None else max_edad
+    info = _cache_info.obtener(ticker, ttl)
+    if info is not None:
+        return info
+    return await vuelos.hacer_async(("info", ticker), _descargar_info, ticker, ttl)
+
+
+_pool_lote = ThreadPoolExecutor(max_workers=MAX_CONCURRENCIA_LOTE, thread_name_prefix="cotizaciones")
+
+
+def obtener_infos(tickers: list, tipo: str = "precio", max_edad: float = None) -> dict:
+    """Devuelve {ticker: {"info": dict | None, "error": str | None}} pidiendo los tickers en paralelo
+
+    Los que están en caché se resuelven sin tocar la red; el resto se reparte
+    en un pool acotado, así la latencia total es la del ticker más lento.
+    Un ticker que falla no afecta al resto.
+    """
+    def _uno(ticker):
+        try:
+            return {"info": obtener_info(ticker, tipo, max_edad), "error": None}
+        except Exception as e:
+            return {"info": None, "error": str(e)}
+
+    unicos = list(dict.fromkeys(t.upper() for t in tickers))
+    # Cada descarga corre con una copia del contexto, así queda dentro de la traza del request
+    contextos = [contextvars.copy_context() for _ in unicos]
+    return dict(zip(unicos, _pool_lote.map(lambda ctx, t: ctx.run(_uno, t), contextos, unicos)))
+
+
+async def obtener_infos_async(tickers: list, tipo: str = "precio", max_edad: float = None) -> dict:
+    """Igual que obtener_infos pero para corrutinas"""
+    async def _uno(ticker):
+        try:
+            return {"info": await obtener_info_async(ticker, tipo, max_edad), "error": None}
+        except Exception as e:
+            return {"info": None, "error": str(e)}
+
+    unicos = list(dict.fromkeys(t.upper() for t in tickers))
+    return dict(zip(unicos, await asyncio.gather(*(_uno(t) for t in unicos))))
+
+
+def estadisticas_cache() -> dict:
+    return {**_cache_info.estadisticas(), "coalescidos": vuelos.estadisticas()}
+
+
+def limpiar_cache(ticker: str = None):
+    _cache_info.invalidar(ticker.upper() if ticker else None)
@@ -0,0 +1,69 @@
+# coalescer.py
+# Single-flight: pedidos concurrentes con la misma clave comparten una sola llamada upstream
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Si llega un pedido para una clave que ya está en vuelo, espera ese resultado en vez de repetirlo
+
+    El primero en pedir una clave (el "líder") ejecuta la función; los demás
+    reciben el mismo resultado o la misma excepción. Apenas termina, la clave
+    se libera: esto no es una caché, solo evita llamadas duplicadas simultáneas.
+    """
+
+    def __init__(self):
+        self._en_vuelo = {}   # clave -> concurrent.futures.Future
+        self._lock = threading.Lock()
+        self.llamadas = 0     # llamadas que fueron upstream
+        self.compartidas = 0  # pedidos que se colgaron de una llamada ya en vuelo
+
+    def hacer(self, clave, funcion, *args):
+        """Versión para threads: bloquea hasta tener el resultado"""
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = self._en_vuelo[clave] = Future()
+                self.llamadas += 1
+            else:
+                self.compartidas += 1
+
+        if not lider:
+            return futuro.result()
+
+        try:
+            resultado = funcion(*args)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+
+    async def hacer_async(self, clave, funcion, *args):
+        """Versión para corrutinas: la función (bloqueante) corre en un thread y la espera no bloquea el loop"""
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            if futuro is not None:
+                self.compartidas += 1
+        if futuro is not None:
+            return await asyncio.wrap_future(futuro)
+        return await asyncio.to_thread(self.hacer, clave, funcion, *args)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "en_vuelo": len(self._en_vuelo),
+                "llamadas": self.llamadas,
+                "compartidas": self.compartidas,
+            }
+
+
+# Instancia compartida; las claves son (tipo de dato, ticker), ej ("info", "AAPL")
+vuelos = SingleFlight()
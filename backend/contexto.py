@@ -0,0 +1,151 @@
+# contexto.py
+# Arma los mensajes que se mandan a Claude dentro de un presupuesto de tokens
+#
+# El historial completo queda intacto en memory.py; acá solo se decide qué
+# parte viaja en cada messages.create:
+#   - los últimos TURNOS_COMPLETOS turnos van tal cual
+#   - en los turnos anteriores los tool_result se reducen a un resumen corto
+#   - si aun así se pasa del presupuesto, se descartan los turnos más viejos
+
+import json
+import logging
+import os
+import threading
+from metricas import histograma
+from traza import anotar
+
+logger = logging.getLogger(__name__)
+
+PRESUPUESTO_TOKENS = int(os.getenv("CONTEXTO_PRESUPUESTO_TOKENS", "8000"))
+TURNOS_COMPLETOS = max(1, int(os.getenv("CONTEXTO_TURNOS_COMPLETOS", "3")))
+LARGO_RESUMEN_TOOL = 200
+
+# llamadas: cada messages.create; chats: cada mensaje del usuario (que puede llevar varias llamadas)
+_stats = {"llamadas": 0, "chats": 0, "tokens_originales": 0, "tokens_enviados": 0}
+_stats_lock = threading.Lock()
+_ahorro_por_chat = histograma(
+    "contexto_tokens_ahorrados_por_chat", "Tokens estimados que no se mandaron a Claude en cada mensaje de chat",
+    buckets=(0, 100, 500, 1000, 2500, 5000, 10000, 25000, 50000),
+)
+
+
+def _a_serializable(contenido):
+    """Los bloques del SDK de Anthropic (tool_use, text) pasan a dict para poder medirlos"""
+    if isinstance(contenido, list):
+        return [b.model_dump() if hasattr(b, "model_dump") else b for b in contenido]
+    return contenido
+
+
+def estimar_tokens(mensajes: list) -> int:
+    """Estimación rápida (~4 caracteres por token), sin ir a la API"""
+    texto = json.dumps([_a_serializable(m["content"]) for m in mensajes], ensure_ascii=False, default=str)
+    return len(texto) // 4
+
+
+def _es_inicio_de_turno(mensaje: dict) -> bool:
+    return mensaje["role"] == "user" and isinstance(mensaje["content"], str)
+
+
+def _separar_turnos(historial: list) -> list:
+    """Agrupa el historial en turnos, cada uno arrancando con un mensaje de texto del usuario"""
+    turnos = []
+    for mensaje in historial:
+        if _es_inicio_de_turno(mensaje) or not turnos:
+            turnos.append([])
+        turnos[-1].append(mensaje)
+    return turnos
+
+
+def _resumir_tool_results(turno: list) -> list:
+    """Copia del turno con cada tool_result recortado a LARGO_RESUMEN_TOOL caracteres"""
+    resumido = []
+    for mensaje in turno:
+        contenido = mensaje["content"]
+        if isinstance(contenido, list) and any(
+            isinstance(b, dict) and b.get("type") == "tool_result" for b in contenido
+        ):
+            contenido = [
+                {**b, "content": b["content"][:LARGO_RESUMEN_TOOL] + " […]"}
+                if b.get("type") == "tool_result" and isinstance(b.get("content"), str)
+                and len(b["content"]) > LARGO_RESUMEN_TOOL
+                else b
+                for b in contenido
+            ]
+        resumido.append({"role": mensaje["role"], "content": contenido})
+    return resumido
+
+
+def preparar_contexto(historial: list, presupuesto: int = None) -> tuple:
+    """Devuelve (mensajes a enviar, stats) respetando el presupuesto de tokens
+
+    stats tiene tokens_originales, tokens_enviados, tokens_ahorrados y
+    turnos_descartados de este request.
+    """
+    presupuesto = presupuesto or PRESUPUESTO_TOKENS
+    turnos = _separar_turnos(historial)
+    viejos, recientes = turnos[:-TURNOS_COMPLETOS], turnos[-TURNOS_COMPLETOS:]
+    viejos = [_resumir_tool_results(t) for t in viejos]
+
+    # Medimos por turno una sola vez y vamos descartando desde el más viejo
+    tokens_recientes = sum(estimar_tokens(t) for t in recientes)
+    tokens_viejos = [estimar_tokens(t) for t in viejos]
+    descartados = 0
+    while viejos and tokens_recientes + sum(tokens_viejos) > presupuesto:
+        viejos.pop(0)
+        tokens_viejos.pop(0)
+        descartados += 1
+
+    mensajes = [m for t in viejos + recientes for m in t]
+    originales = tokens_recientes + sum(estimar_tokens(t) for t in turnos[:-TURNOS_COMPLETOS])
+    enviados = tokens_recientes + sum(tokens_viejos)
+    stats = {
+        "tokens_originales": originales,
+        "tokens_enviados": enviados,
+        "tokens_ahorrados": max(originales - enviados, 0),
+        "turnos_descartados": descartados,
+    }
+
+    with _stats_lock:
+        _stats["llamadas"] += 1
+        _stats["tokens_originales"] += originales
+        _stats["tokens_enviados"] += enviados
+    if stats["tokens_ahorrados"]:
+        logger.info("contexto: %(tokens_enviados)d tokens enviados, %(tokens_ahorrados)d ahorrados", stats)
+    return mensajes, stats
+
+
+class ContextoChat:
+    """Suma los recortes de todas las llamadas a Claude de un mismo mensaje de chat"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.tokens_originales = 0
+        self.tokens_enviados = 0
+        self.turnos_descartados = 0
+
+    def sumar(self, stats: dict):
+        self.llamadas += 1
+        self.tokens_originales += stats["tokens_originales"]
+        self.tokens_enviados += stats["tokens_enviados"]
+        self.turnos_descartados += stats["turnos_descartados"]
+
+    def cerrar(self, sesion_id: str):
+        """Fin del mensaje: registra y loguea cuánto se ahorró en total"""
+        if not self.llamadas:
+            return
+        ahorrados = max(self.tokens_originales - self.tokens_enviados, 0)
+        with _stats_lock:
+            _stats["chats"] += 1
+        _ahorro_por_chat.observar(ahorrados)
+        anotar(contexto_tokens_enviados=self.tokens_enviados, contexto_tokens_ahorrados=ahorrados)
+        logger.info(
+            "contexto sesion=%s: %d llamadas, %d tokens enviados, %d ahorrados (%d turnos descartados)",
+            sesion_id, self.llamadas, self.tokens_enviados, ahorrados, self.turnos_descartados,
+        )
+
+
+def estadisticas_contexto() -> dict:
+    with _stats_lock:
+        stats = {**_stats, "tokens_ahorrados": _stats["tokens_originales"] - _stats["tokens_enviados"]}
+    stats["tokens_ahorrados_por_chat"] = round(stats["tokens_ahorrados"] / stats["chats"], 1) if stats["chats"] else 0.0
+    return stats
@@ -0,0 +1,151 @@
+# fundamentales.py
+# Snapshot diario de fundamentales por ticker, guardado en SQLite y refrescado en segundo plano
+#
+# Del .info de yfinance (decenas de campos) solo se guardan los que se
+# muestran. Una tarea de fondo mantiene al día los tickers de la watchlist y
+# del portfolio, así la tool y el dashboard leen del disco y no esperan a la
+# red. Solo un ticker que nunca se vio se baja en el momento.
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import date
+from cache import obtener_infos
+from storage import obtener_fundamentales, guardar_fundamentales, listar_watchlist, listar_portfolio
+
+logger = logging.getLogger(__name__)
+
+# Los fundamentales cambian como mucho una vez por día
+TTL_FUNDAMENTALES = float(os.getenv("FUNDAMENTALES_TTL", str(24 * 3600)))
+# Cada cuánto la tarea de fondo busca snapshots vencidos
+INTERVALO = float(os.getenv("FUNDAMENTALES_INTERVALO", "3600"))
+LARGO_DESCRIPCION = 300
+
+# Campo guardado -> claves del .info en orden de preferencia
+CAMPOS = {
+    "nombre": ("longName", "shortName"),
+    "nombre_corto": ("shortName", "longName"),
+    "moneda": ("currency",),
+    "sector": ("sector",),
+    "industria": ("industry",),
+    "market_cap": ("marketCap",),
+    "pe": ("trailingPE",),
+    "dividend_yield": ("dividendYield",),
+    "max_52": ("fiftyTwoWeekHigh",),
+    "min_52": ("fiftyTwoWeekLow",),
+    "descripcion": ("longBusinessSummary",),
+}
+
+_pendientes = set()   # tickers vencidos pedidos fuera de la watchlist/portfolio
+_pendientes_lock = threading.Lock()
+_loop = None
+_despertar = None
+
+
+def proyectar(info: dict) -> dict:
+    """Se queda con los campos de CAMPOS; los que yfinance no trae quedan en None"""
+    datos = {
+        campo: next((info[c] for c in claves if info.get(c) is not None), None)
+        for campo, claves in CAMPOS.items()
+    }
+    if datos["descripcion"]:
+        datos["descripcion"] = datos["descripcion"][:LARGO_DESCRIPCION]
+    return datos
+
+
+def refrescar(tickers: list) -> int:
+    """Baja el .info de los tickers y guarda su snapshot; devuelve cuántos se actualizaron"""
+    resultados = obtener_infos(tickers, "fundamental")
+    snapshots = {}
+    for ticker, r in resultados.items():
+        if r["error"]:
+            logger.warning("No se pudieron refrescar los fundamentales de %s: %s", ticker, r["error"])
+        elif r["info"]:
+            info = r["info"]
+            # Sin nombre ni precio el ticker no existe: no se guarda un snapshot vacío
+            if not (info.get("longName") or info.get("shortName") or info.get("currentPrice") or info.get("regularMarketPrice")):
+                logger.info("%s no tiene fundamentales (¿ticker inexistente?)", ticker)
+                continue
+            snapshots[ticker] = proyectar(info)
+    if snapshots:
+        guardar_fundamentales(snapshots, date.today().isoformat(), time.time())
+    return len(snapshots)
+
+
+def _vencido(snapshot: dict) -> bool:
+    return time.time() - snapshot["actualizado"] > TTL_FUNDAMENTALES
+
+
+def _encolar(tickers: list):
+    """Pide a la tarea de fondo que refresque estos tickers en la próxima vuelta"""
+    with _pendientes_lock:
+        _pendientes.update(tickers)
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_despertar.set)
+
+
+def obtener_lote(tickers: list, esperar_faltantes: bool = False) -> dict:
+    """Devuelve {ticker: {**datos, "fecha"}} leyendo el snapshot guardado
+
+    Los vencidos se devuelven igual y se encolan para la tarea de fondo. Los
+    que no tienen snapshot se bajan en el momento si esperar_faltantes=True;
+    si no, se encolan y quedan afuera del resultado.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    guardados = obtener_fundamentales(tickers)
+    faltantes = [t for t in tickers if t not in guardados]
+    if faltantes and esperar_faltantes:
+        refrescar(faltantes)
+        guardados.update(obtener_fundamentales(faltantes))
+        faltantes = [t for t in faltantes if t not in guardados]
+
+    a_refrescar = faltantes + [t for t, s in guardados.items() if _vencido(s)]
+    if a_refrescar:
+        _encolar(a_refrescar)
+    return {t: {**guardados[t]["datos"], "fecha": guardados[t]["fecha"]} for t in tickers if t in guardados}
+
+
+def obtener(ticker: str) -> dict:
+    """Snapshot de un ticker; lanza ValueError si no hay datos ni siquiera bajándolos"""
+    snapshot = obtener_lote([ticker], esperar_faltantes=True).get(ticker.upper())
+    if snapshot is None:
+        raise ValueError(f"sin datos fundamentales para {ticker.upper()}")
+    return snapshot
+
+
+async def loop_refresco():
+    """Tarea de fondo: refresca los snapshots vencidos de watchlist, portfolio y pendientes"""
+    global _loop, _despertar
+    _loop = asyncio.get_running_loop()
+    _despertar = asyncio.Event()
+    try:
+        await _refrescar_siempre()
+    finally:
+        # Sin tarea de fondo, _encolar solo deja los tickers anotados
+        _loop = None
+
+
+async def _refrescar_siempre():
+    while True:
+        try:
+            with _pendientes_lock:
+                pendientes = list(_pendientes)
+                _pendientes.clear()
+            seguidos = await asyncio.to_thread(
+                lambda: listar_watchlist() + [p["ticker"] for p in listar_portfolio()]
+            )
+            tickers = list(dict.fromkeys(seguidos + pendientes))
+            guardados = await asyncio.to_thread(obtener_fundamentales, tickers)
+            vencidos = [t for t in tickers if t not in guardados or _vencido(guardados[t])]
+            if vencidos:
+                actualizados = await asyncio.to_thread(refrescar, vencidos)
+                logger.info("fundamentales: %d de %d snapshots actualizados", actualizados, len(vencidos))
+        except Exception:
+            logger.exception("Error refrescando fundamentales")
+        try:
+            await asyncio.wait_for(_despertar.wait(), timeout=INTERVALO)
+        except asyncio.TimeoutError:
+            pass
+        _despertar.clear()
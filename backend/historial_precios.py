@@ -0,0 +1,124 @@
+# historial_precios.py
+# Historial diario OHLCV por ticker guardado en disco, actualizado incrementalmente
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from coalescer import vuelos
+from proveedores import obtener_proveedor
+
+HISTORIAL_DIR = Path(__file__).parent / "precios"
+
+# Cada ticker es un .npy con forma (6, n): una fila contigua por columna,
+# así leer los cierres es una vista del archivo mapeado en memoria (sin copias)
+FECHA, APERTURA, MAXIMO, MINIMO, CIERRE, VOLUMEN = range(6)
+_COLUMNAS_YF = ["Open", "High", "Low", "Close", "Volume"]
+
+# Mientras el archivo tenga menos de esta antigüedad no se consulta al proveedor
+# (el último bar del día va cambiando, así que no puede ser mucho más largo)
+TTL_HISTORIAL = float(os.getenv("HISTORIAL_TTL", "900"))
+# La primera descarga trae varios años para que alcance a los backtests (ver backtest.py)
+PERIODO_INICIAL = os.getenv("HISTORIAL_PERIODO_INICIAL", "5y")
+
+MAX_CONCURRENCIA_LOTE = int(os.getenv("HISTORIAL_MAX_CONCURRENCIA_LOTE", "8"))
+
+def _archivo(ticker: str) -> Path:
+    # ^MERV, BTC-USD, etc: nos quedamos con un nombre de archivo seguro
+    seguro = "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
+    return HISTORIAL_DIR / f"{seguro}.npy"
+
+
+def _a_columnas(hist) -> np.ndarray:
+    """Convierte el DataFrame del proveedor (formato yfinance) al formato columnar (6, n)"""
+    indice = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+    fechas = indice.values.astype("datetime64[D]").astype(np.float64)
+    valores = hist[_COLUMNAS_YF].to_numpy(dtype=np.float64).T
+    return np.vstack([fechas, valores])
+
+
+def _guardar(archivo: Path, barras: np.ndarray):
+    """Escribe a un temporal y lo renombra: quien esté leyendo el archivo viejo no se entera"""
+    HISTORIAL_DIR.mkdir(exist_ok=True)
+    temporal = archivo.with_suffix(".tmp.npy")
+    np.save(temporal, np.ascontiguousarray(barras))
+    os.replace(temporal, archivo)
+
+
+def _leer(archivo: Path):
+    if not archivo.exists():
+        return None
+    return np.load(archivo, mmap_mode="r")
+
+
+def _vencido(archivo: Path) -> bool:
+    return not archivo.exists() or time.time() - archivo.stat().st_mtime > TTL_HISTORIAL
+
+
+def _actualizar(ticker: str, archivo: Path):
+    """Trae del proveedor solo los bars que faltan y los agrega al archivo"""
+    # Otra actualización pudo haber terminado entre que miramos y llegamos acá
+    if not _vencido(archivo):
+        return
+    guardadas = _leer(archivo)
+    proveedor = obtener_proveedor()
+
+    if guardadas is None or guardadas.shape[1] == 0:
+        nuevas = _a_columnas(proveedor.historial(ticker, periodo=PERIODO_INICIAL))
+        _guardar(archivo, nuevas)
+        return
+
+    # Pedimos desde el último bar guardado inclusive: ese puede haber sido un bar parcial
+    ultima = np.datetime64(int(guardadas[FECHA, -1]), "D")
+    hist = proveedor.historial(ticker, desde=str(ultima))
+    if hist.empty:
+        archivo.touch()
+        return
+
+    nuevas = _a_columnas(hist)
+    conservar = guardadas[FECHA] < nuevas[FECHA, 0]
+    _guardar(archivo, np.hstack([guardadas[:, conservar], nuevas]))
+
+
+def obtener_barras(ticker: str, dias: int = None) -> np.ndarray:
+    """Devuelve los últimos `dias` bars diarios de un ticker como array (6, n) de solo lectura
+
+    Las filas se indexan con FECHA, APERTURA, MAXIMO, MINIMO, CIERRE y VOLUMEN
+    (la fecha en días desde 1970-01-01). Solo va a la red si el archivo local
+    está vencido, y en ese caso trae únicamente los bars nuevos.
+    """
+    ticker = ticker.upper()
+    archivo = _archivo(ticker)
+
+    if _vencido(archivo):
+        try:
+            # Si otro thread ya está actualizando este ticker, esperamos esa misma descarga
+            vuelos.hacer(("historial", ticker), _actualizar, ticker, archivo)
+        except Exception:
+            # Sin red preferimos datos de hace un rato antes que nada
+            if not archivo.exists():
+                raise
+
+    barras = _leer(archivo)
+    if barras is None:
+        return np.empty((6, 0))
+    return barras[:, -dias:] if dias else barras
+
+
+_pool_lote = ThreadPoolExecutor(max_workers=MAX_CONCURRENCIA_LOTE, thread_name_prefix="historial")
+
+
+def obtener_barras_lote(tickers: list, dias: int = None) -> dict:
+    """Devuelve {ticker: barras | Exception} actualizando los tickers vencidos en paralelo"""
+    def _uno(ticker):
+        try:
+            return obtener_barras(ticker, dias)
+        except Exception as e:
+            return e
+
+    unicos = list(dict.fromkeys(t.upper() for t in tickers))
+    # Con copia del contexto para que las descargas aparezcan en la traza del request
+    contextos = [contextvars.copy_context() for _ in unicos]
+    return dict(zip(unicos, _pool_lote.map(lambda ctx, t: ctx.run(_uno, t), contextos, unicos)))
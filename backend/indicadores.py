@@ -0,0 +1,141 @@
+# indicadores.py
+# Indicadores técnicos vectorizados para muchos tickers a la vez
+#
+# Todas las funciones reciben matrices (tickers × bars) y operan sobre todas
+# las filas en una sola pasada. Los tickers con menos historia se rellenan
+# con NaN a la izquierda (ver alinear), y los resultados quedan en NaN hasta
+# que hay bars suficientes.
+
+import numpy as np
+import pandas as pd
+from historial_precios import obtener_barras_lote, MAXIMO, MINIMO, CIERRE
+
+# Bars que se leen del historial: alcanzan para la SMA200 y para que el RSI de Wilder converja
+BARS_INDICADORES = 300
+
+
+def alinear(series: list) -> np.ndarray:
+    """Apila series 1-D de distinto largo en una matriz, alineadas por el último bar"""
+    largo = max((len(s) for s in series), default=0)
+    matriz = np.full((len(series), largo), np.nan)
+    for i, s in enumerate(series):
+        if len(s):
+            matriz[i, largo - len(s):] = s
+    return matriz
+
+
+def _df(x: np.ndarray) -> pd.DataFrame:
+    # pandas trabaja por columnas: cada ticker pasa a ser una columna
+    return pd.DataFrame(np.asarray(x, dtype=np.float64).T)
+
+
+def sma(x: np.ndarray, n: int) -> np.ndarray:
+    return _df(x).rolling(n).mean().to_numpy().T
+
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    """EMA clásica (alpha = 2 / (n + 1)), arrancando en el primer valor de cada fila"""
+    return _df(x).ewm(span=n, adjust=False).mean().to_numpy().T
+
+
+def wilder(x: np.ndarray, n: int) -> np.ndarray:
+    """Suavizado de Wilder (alpha = 1 / n) sembrado con la media simple de los primeros n valores"""
+    df = _df(x)
+    media = df.rolling(n).mean()
+    # Primer bar de cada ticker donde ya hay n valores: ahí va la semilla
+    es_semilla = media.notna() & media.shift(1).isna()
+    sembrado = df.where(media.notna()).mask(es_semilla, media)
+    return sembrado.ewm(alpha=1 / n, adjust=False).mean().to_numpy().T
+
+
+def rsi(cierres: np.ndarray, n: int = 14) -> np.ndarray:
+    deltas = np.diff(cierres, axis=1, prepend=np.nan)
+    ganancias = wilder(np.where(np.isnan(deltas), np.nan, np.clip(deltas, 0, None)), n)
+    perdidas = wilder(np.where(np.isnan(deltas), np.nan, np.clip(-deltas, 0, None)), n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultado = 100 - 100 / (1 + ganancias / perdidas)
+    # Sin pérdidas en la ventana el RSI es 100
+    return np.where((perdidas == 0) & ~np.isnan(ganancias), 100.0, resultado)
+
+
+def macd(cierres: np.ndarray, rapida: int = 12, lenta: int = 26, senal: int = 9):
+    """Devuelve (macd, señal, histograma)"""
+    linea = ema(cierres, rapida) - ema(cierres, lenta)
+    linea_senal = ema(linea, senal)
+    return linea, linea_senal, linea - linea_senal
+
+
+def bollinger(cierres: np.ndarray, n: int = 20, k: float = 2.0):
+    """Devuelve (media, banda superior, banda inferior)"""
+    df = _df(cierres)
+    media = df.rolling(n).mean().to_numpy().T
+    desvio = df.rolling(n).std(ddof=0).to_numpy().T
+    return media, media + k * desvio, media - k * desvio
+
+
+def atr(maximos: np.ndarray, minimos: np.ndarray, cierres: np.ndarray, n: int = 14) -> np.ndarray:
+    cierre_previo = np.roll(cierres, 1, axis=1)
+    cierre_previo[:, 0] = np.nan
+    rango = np.fmax(
+        maximos - minimos,
+        np.fmax(np.abs(maximos - cierre_previo), np.abs(minimos - cierre_previo))
+    )
+    return wilder(rango, n)
+
+
+def _ultimo(x: np.ndarray, decimales: int = 2) -> list:
+    """Último valor de cada fila, redondeado, con None donde no hay dato"""
+    return [None if np.isnan(v) else round(float(v), decimales) for v in x[:, -1]]
+
+
+def calcular_todos(maximos: np.ndarray, minimos: np.ndarray, cierres: np.ndarray) -> list:
+    """Calcula todos los indicadores para todas las filas y devuelve el último valor de cada uno"""
+    macd_linea, macd_senal, macd_hist = macd(cierres)
+    boll_media, boll_sup, boll_inf = bollinger(cierres)
+    columnas = {
+        "precio": _ultimo(cierres),
+        "rsi": _ultimo(rsi(cierres)),
+        "sma20": _ultimo(sma(cierres, 20)),
+        "sma50": _ultimo(sma(cierres, 50)),
+        "sma200": _ultimo(sma(cierres, 200)),
+        "ema20": _ultimo(ema(cierres, 20)),
+        "macd": _ultimo(macd_linea, 4),
+        "macd_senal": _ultimo(macd_senal, 4),
+        "macd_hist": _ultimo(macd_hist, 4),
+        "bollinger_media": _ultimo(boll_media),
+        "bollinger_sup": _ultimo(boll_sup),
+        "bollinger_inf": _ultimo(boll_inf),
+        "atr": _ultimo(atr(maximos, minimos, cierres)),
+    }
+    return [dict(zip(columnas, fila)) for fila in zip(*columnas.values())]
+
+
+def senal_rsi(valor) -> str:
+    if valor is None:
+        return "sin datos"
+    if valor >= 70:
+        return "sobrecomprado"
+    if valor <= 30:
+        return "sobrevendido"
+    return "neutral"
+
+
+def indicadores_de_tickers(tickers: list) -> dict:
+    """Lee el historial local de cada ticker y calcula todos los indicadores en una sola pasada
+
+    Devuelve {ticker: dict de indicadores} o {ticker: {"error": str}} si no hay datos.
+    """
+    barras = obtener_barras_lote(tickers, dias=BARS_INDICADORES)
+    validos = [t for t, b in barras.items() if not isinstance(b, Exception) and b.shape[1] >= 20]
+    resultado = {
+        t: {"error": str(b) if isinstance(b, Exception) else "historial insuficiente"}
+        for t, b in barras.items() if t not in validos
+    }
+    if validos:
+        maximos = alinear([barras[t][MAXIMO] for t in validos])
+        minimos = alinear([barras[t][MINIMO] for t in validos])
+        cierres = alinear([barras[t][CIERRE] for t in validos])
+        for ticker, datos in zip(validos, calcular_todos(maximos, minimos, cierres)):
+            datos["rsi_signal"] = senal_rsi(datos["rsi"])
+            resultado[ticker] = datos
+    return {t: resultado[t] for t in barras}
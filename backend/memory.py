@@ -1,57 +1,335 @@
 # memory.py
-# Maneja el historial de la conversación con persistencia en JSON
+# Maneja el historial de cada sesión de chat con persistencia en logs append-only
 
+import asyncio
+import contextvars
 import json
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from metricas import histograma
+from traza import span
 
-HISTORIAL_FILE = Path(__file__).parent / "historial.json"
+# Un log por sesión, un mensaje por línea (JSON Lines). Agregar un mensaje es
+# escribir una línea, sin importar lo larga que sea la conversación
+HISTORIALES_DIR = Path(__file__).parent / "historiales"
+# Formatos anteriores (una única conversación global); se migran a la sesión
+# por defecto al arrancar el servidor (ver migrar_legacy)
+HISTORIAL_FILE_LEGACY_JSONL = Path(__file__).parent / "historial.jsonl"
+HISTORIAL_FILE_LEGACY = Path(__file__).parent / "historial.json"
+
+_persistencia = histograma(
+    "historial_persistencia_segundos", "Tiempo de escritura del historial a disco", ("operacion",)
+)
+
+SESION_DEFAULT = "default"
+_SESION_VALIDA = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Mensajes que se cargan de disco y que se mantienen en memoria por sesión
+MAX_MENSAJES = int(os.getenv("HISTORIAL_MAX_MENSAJES", "100"))
+# Cuando un log supera estas líneas se compacta, dejando solo las últimas MAX_MENSAJES
+MAX_LINEAS_LOG = int(os.getenv("HISTORIAL_MAX_LINEAS_LOG", "1000"))
+# Sesiones que se mantienen en memoria; las menos usadas se descargan
+# (sus mensajes de texto ya están en disco y se recargan al volver)
+MAX_SESIONES_ACTIVAS = int(os.getenv("HISTORIAL_MAX_SESIONES", "200"))
+# Threads que escriben el historial (write + fsync) fuera del event loop
+MAX_ESCRITORES = int(os.getenv("HISTORIAL_MAX_ESCRITORES", "4"))
 
 # ─── HELPERS INTERNOS ────────────────────────
 
-def _leer() -> list:
-    """Lee el historial desde el archivo JSON"""
-    if not HISTORIAL_FILE.exists():
-        return []
-    try:
-        with open(HISTORIAL_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
+def _archivo(sesion_id: str) -> Path:
+    return HISTORIALES_DIR / f"{sesion_id}.jsonl"
+
+def _leer_cola(archivo: Path, n: int) -> list:
+    """Lee las últimas n líneas válidas del log sin recorrer el archivo entero"""
+    if not archivo.exists():
         return []
+    bloque = 64 * 1024
+    with open(archivo, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        datos = b""
+        # Leemos bloques desde el final hasta tener n líneas completas
+        while posicion > 0 and datos.count(b"\n") <= n:
+            leer = min(bloque, posicion)
+            posicion -= leer
+            f.seek(posicion)
+            datos = f.read(leer) + datos
+
+    lineas = datos.split(b"\n")
+    if posicion > 0:
+        lineas = lineas[1:]  # la primera puede estar cortada a la mitad
+    mensajes = []
+    for linea in lineas:
+        if not linea.strip():
+            continue
+        try:
+            mensajes.append(json.loads(linea))
+        except json.JSONDecodeError:
+            # Una línea a medio escribir por un corte: la salteamos
+            continue
+    return mensajes[-n:]
+
+def _anexar(archivo: Path, mensaje: dict):
+    """Agrega un mensaje al final del log y espera a que esté en disco"""
+    with open(archivo, "a", encoding="utf-8") as f:
+        f.write(json.dumps(mensaje, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _reescribir(archivo: Path, mensajes: list):
+    """Reemplaza el log de forma atómica: temporal + fsync + rename"""
+    HISTORIALES_DIR.mkdir(exist_ok=True)
+    temporal = archivo.with_suffix(".jsonl.tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        for mensaje in mensajes:
+            f.write(json.dumps(mensaje, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, archivo)
+
+def _contar_lineas(archivo: Path) -> int:
+    if not archivo.exists():
+        return 0
+    with open(archivo, "rb") as f:
+        return sum(1 for _ in f)
+
+def _reparar_cola(archivo: Path):
+    """Si un corte dejó la última línea a medio escribir, la descarta para poder seguir anexando"""
+    if not archivo.exists():
+        return
+    with open(archivo, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        if tamano == 0:
+            return
+        f.seek(tamano - 1)
+        if f.read(1) == b"\n":
+            return
+        # Retrocedemos hasta el último salto de línea completo
+        posicion = tamano
+        while posicion > 0:
+            leer = min(4096, posicion)
+            posicion -= leer
+            f.seek(posicion)
+            corte = f.read(leer).rfind(b"\n")
+            if corte != -1:
+                f.truncate(posicion + corte + 1)
+                return
+        f.truncate(0)
+
+def migrar_legacy():
+    """Pasa el historial global viejo a la sesión por defecto (una sola vez)
+
+    Se llama desde el lifespan de la API y no al importar: así un script que
+    importa memory (benchmark.py) no toca los historiales reales.
+    """
+    destino = _archivo(SESION_DEFAULT)
+    if destino.exists():
+        return
+    if HISTORIAL_FILE_LEGACY_JSONL.exists():
+        HISTORIALES_DIR.mkdir(exist_ok=True)
+        os.replace(HISTORIAL_FILE_LEGACY_JSONL, destino)
+    elif HISTORIAL_FILE_LEGACY.exists():
+        try:
+            with open(HISTORIAL_FILE_LEGACY, "r", encoding="utf-8") as f:
+                mensajes = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            mensajes = []
+        _reescribir(destino, mensajes[-MAX_MENSAJES:])
+        HISTORIAL_FILE_LEGACY.unlink()
+
+def _recortar(historial: list):
+    """Deja como mucho MAX_MENSAJES, empezando siempre en un mensaje de texto del usuario
+
+    Así nunca queda un tool_result huérfano al principio (Claude lo rechazaría).
+    """
+    if len(historial) <= MAX_MENSAJES:
+        return
+    inicio = len(historial) - MAX_MENSAJES
+    while inicio < len(historial) and not (
+        historial[inicio]["role"] == "user" and isinstance(historial[inicio]["content"], str)
+    ):
+        inicio += 1
+    del historial[:inicio]
+
+# ─── SESIONES ────────────────────────────────
+
+class _Sesion:
+    """Historial en memoria de una sesión más el estado de su log en disco"""
+
+    def __init__(self, sesion_id: str):
+        self.archivo = _archivo(sesion_id)
+        # Cargamos solo la cola del log que entra en el contexto
+        _reparar_cola(self.archivo)
+        self.mensajes = _leer_cola(self.archivo, MAX_MENSAJES)
+        _recortar(self.mensajes)
+        while self.mensajes and self.mensajes[0]["role"] != "user":
+            self.mensajes.pop(0)
+        self.lineas_log = _contar_lineas(self.archivo)
+        # Turnos del agente corriendo sobre esta sesión (ver abrir_turno/cerrar_turno)
+        self.turnos_en_curso = 0
+
+
+_sesiones = OrderedDict()   # sesion_id -> _Sesion, de la menos a la más usada
+_lock = threading.Lock()
+
+
+def _validar(sesion_id: str) -> str:
+    if not _SESION_VALIDA.match(sesion_id or ""):
+        raise ValueError(f"Id de sesión inválido: {sesion_id!r}")
+    return sesion_id
+
+
+def _obtener_sesion(sesion_id: str) -> _Sesion:
+    """Devuelve la sesión (cargándola de disco si hace falta) y la marca como la más reciente"""
+    _validar(sesion_id)
+    with _lock:
+        sesion = _sesiones.get(sesion_id)
+    if sesion is None:
+        # La lectura del log va fuera del lock, para no frenar a las demás sesiones;
+        # si dos threads la cargan a la vez, queda la primera que llegó
+        cargada = _Sesion(sesion_id)
+    with _lock:
+        if sesion is None:
+            sesion = _sesiones.setdefault(sesion_id, cargada)
+        _sesiones.move_to_end(sesion_id)
 
-def _guardar(historial: list):
-    """Guarda el historial en el archivo JSON"""
-    # Solo guardamos mensajes serializables (texto plano)
-    # Los mensajes con tool_use (listas) los guardamos tal cual
-    serializable = []
-    for msg in historial:
-        if isinstance(msg["content"], str):
-            serializable.append(msg)
-        # Ignoramos los mensajes intermedios de tool_use (son solo para Claude)
-        # Esto mantiene el archivo limpio con solo user/assistant de texto
-    with open(HISTORIAL_FILE, "w", encoding="utf-8") as f:
-        json.dump(serializable, f, ensure_ascii=False, indent=2)
-
-# ─── HISTORIAL EN MEMORIA (sesión actual) ─────
-
-# Cargamos el historial guardado al arrancar
-_historial_sesion = _leer()
-
-def agregar_mensaje(rol, contenido):
-    """Agrega un mensaje al historial en memoria y persiste si es texto"""
-    _historial_sesion.append({
+        # Descargamos las menos usadas; las que tienen un turno abierto
+        # se saltean porque sus tool_use todavía no están en disco
+        sobrantes = len(_sesiones) - MAX_SESIONES_ACTIVAS
+        for candidata in list(_sesiones):
+            if sobrantes <= 0:
+                break
+            if candidata != sesion_id and not _sesiones[candidata].turnos_en_curso:
+                del _sesiones[candidata]
+                sobrantes -= 1
+        return sesion
+
+# ─── API ─────────────────────────────────────
+
+def agregar_mensaje(rol, contenido, sesion_id=SESION_DEFAULT):
+    """Agrega un mensaje al historial de la sesión y persiste si es texto"""
+    sesion = _obtener_sesion(sesion_id)
+    mensaje = {
         "role": rol,
         "content": contenido
-    })
-    # Solo persistimos cuando es un mensaje de texto (user string o assistant string)
-    if isinstance(contenido, str):
-        _guardar(_historial_sesion)
-
-def obtener_historial():
-    """Devuelve el historial completo de la sesión"""
-    return _historial_sesion
-
-def limpiar_historial():
-    """Resetea la conversación en memoria y en disco"""
-    _historial_sesion.clear()
-    if HISTORIAL_FILE.exists():
-        HISTORIAL_FILE.unlink()
+    }
+    sesion.mensajes.append(mensaje)
+
+    # Solo persistimos los mensajes de texto (user string o assistant string);
+    # los intermedios de tool_use son solo para Claude
+    if not isinstance(contenido, str):
+        return
+
+    # Un mensaje de texto del usuario abre un turno nuevo: buen momento para recortar
+    if rol == "user":
+        _recortar(sesion.mensajes)
+
+    HISTORIALES_DIR.mkdir(exist_ok=True)
+    with _persistencia.medir("anexar"), span("historial.anexar", sesion=sesion_id, rol=rol):
+        _anexar(sesion.archivo, mensaje)
+    sesion.lineas_log += 1
+    if sesion.lineas_log > MAX_LINEAS_LOG:
+        textos = [m for m in sesion.mensajes if isinstance(m["content"], str)]
+        with _persistencia.medir("compactar"), span("historial.compactar", sesion=sesion_id):
+            _reescribir(sesion.archivo, textos)
+        sesion.lineas_log = len(textos)
+
+_pool_escritura = ThreadPoolExecutor(max_workers=MAX_ESCRITORES, thread_name_prefix="historial")
+
+
+async def agregar_mensaje_async(rol, contenido, sesion_id=SESION_DEFAULT):
+    """Igual que agregar_mensaje pero para corrutinas: el fsync corre en un thread propio
+
+    Un disco lento demora solo a la sesión que escribe, no al event loop.
+    Cada llamada espera a la anterior, así que el orden de los mensajes se mantiene.
+    """
+    loop = asyncio.get_running_loop()
+    # Con el contexto copiado, los spans de historial quedan dentro de la traza del request
+    contexto = contextvars.copy_context()
+    await loop.run_in_executor(_pool_escritura, contexto.run, agregar_mensaje, rol, contenido, sesion_id)
+
+# Un candado por sesión, para que dos turnos (dos pestañas, o clientes sin
+# sesion_id sobre "default") no intercalen sus tool_use/tool_result. Débil:
+# desaparece cuando nadie tiene ni espera el turno de esa sesión
+_candados_turno = weakref.WeakValueDictionary()
+
+def _candado_turno(sesion_id: str) -> asyncio.Lock:
+    candado = _candados_turno.get(sesion_id)
+    if candado is None:
+        candado = _candados_turno[sesion_id] = asyncio.Lock()
+    return candado
+
+@asynccontextmanager
+async def turno(sesion_id=SESION_DEFAULT):
+    """Un turno del agente a la vez por sesión; mientras dura, la sesión no se descarga de memoria
+
+    Si la sesión no está en memoria se carga de disco en un thread, fuera del event loop.
+    """
+    _validar(sesion_id)
+    async with _candado_turno(sesion_id):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_pool_escritura, abrir_turno, sesion_id)
+        try:
+            yield
+        finally:
+            cerrar_turno(sesion_id)
+
+def abrir_turno(sesion_id=SESION_DEFAULT):
+    """Marca que el agente está respondiendo en la sesión: mientras tanto no se descarga de memoria"""
+    sesion = _obtener_sesion(sesion_id)
+    with _lock:
+        sesion.turnos_en_curso += 1
+
+def cerrar_turno(sesion_id=SESION_DEFAULT):
+    """Fin del turno (con respuesta o no); va en un finally para que la sesión no quede fija
+
+    Si el turno se cortó a mitad de una ronda de tools, los tool_use/tool_result
+    que quedaron colgados se descartan: no están en disco y Claude los rechazaría.
+    """
+    with _lock:
+        sesion = _sesiones.get(sesion_id)
+        if sesion is None:
+            return
+        sesion.turnos_en_curso = max(sesion.turnos_en_curso - 1, 0)
+        if not sesion.turnos_en_curso:
+            while sesion.mensajes and not isinstance(sesion.mensajes[-1]["content"], str):
+                sesion.mensajes.pop()
+
+def obtener_historial(sesion_id=SESION_DEFAULT):
+    """Devuelve el historial de la sesión (como mucho los últimos MAX_MENSAJES)"""
+    return _obtener_sesion(sesion_id).mensajes
+
+def limpiar_historial(sesion_id=SESION_DEFAULT):
+    """Resetea la conversación de una sesión en memoria y en disco
+
+    Desde el event loop usar limpiar_historial_async, que espera al turno en curso.
+    """
+    _validar(sesion_id)
+    with _lock:
+        sesion = _sesiones.get(sesion_id)
+        if sesion is not None and sesion.turnos_en_curso:
+            raise RuntimeError(f"La sesión {sesion_id} tiene un turno en curso")
+        _sesiones.pop(sesion_id, None)
+        archivo = _archivo(sesion_id)
+        if archivo.exists():
+            archivo.unlink()
+
+async def limpiar_historial_async(sesion_id=SESION_DEFAULT):
+    """Igual que limpiar_historial, pero espera a que termine el turno en curso de la sesión
+
+    Si no, el turno seguiría escribiendo en una sesión nueva que se podría descargar a la mitad.
+    """
+    _validar(sesion_id)
+    async with _candado_turno(sesion_id):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_pool_escritura, limpiar_historial, sesion_id)
+
+def sesiones_activas() -> int:
+    return len(_sesiones)
@@ -0,0 +1,174 @@
+# metricas.py
+# Métricas en formato Prometheus sin dependencias externas
+#
+# Contadores e histogramas en memoria del proceso, con un lock cada uno y
+# sin trabajo extra en el camino caliente más allá de un bisect y dos sumas.
+# Lo que ya se cuenta en otros módulos (caché, memo de tools, single-flight,
+# contexto) no se duplica: se lee recién cuando alguien pide /metrics.
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Buckets en segundos: de una lectura de caché a un turno completo de Claude
+BUCKETS_DEFAULT = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_metricas = {}   # nombre -> Contador | Histograma, en orden de registro
+_colectores = []   # funciones que devuelven métricas calculadas al momento del scrape
+_registro_lock = threading.Lock()
+
+
+def _etiquetas(nombres: tuple, valores: tuple) -> str:
+    if not nombres:
+        return ""
+    pares = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+        for n, v in zip(nombres, valores)
+    )
+    return "{" + pares + "}"
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, *valores, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self) -> list:
+        with self._lock:
+            valores = dict(self._valores)
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        lineas += [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}" for k, v in valores.items()]
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_DEFAULT):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # valores de etiquetas -> [conteos por bucket (+Inf al final), suma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores):
+        # Los conteos se guardan por bucket y se acumulan recién al exponer
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, *valores):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *valores)
+
+    def exponer(self) -> list:
+        with self._lock:
+            series = {k: (list(conteos), suma) for k, (conteos, suma) in self._series.items()}
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        nombres = self.etiquetas + ("le",)
+        for valores, (conteos, suma) in series.items():
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else _numero(limite)
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, valores + (le,))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+def _registrar(metrica):
+    with _registro_lock:
+        if metrica.nombre in _metricas:
+            return _metricas[metrica.nombre]
+        _metricas[metrica.nombre] = metrica
+        return metrica
+
+
+def contador(nombre: str, ayuda: str, etiquetas: tuple = ()) -> Contador:
+    """Crea (o devuelve, si ya existe) el contador con ese nombre"""
+    return _registrar(Contador(nombre, ayuda, etiquetas))
+
+
+def histograma(nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_DEFAULT) -> Histograma:
+    """Crea (o devuelve, si ya existe) el histograma con ese nombre"""
+    return _registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+
+def colector(funcion):
+    """Registra una función que devuelve [(nombre, tipo, ayuda, {etiquetas: valor})] al hacer scrape
+
+    `etiquetas` es un tuple de pares (nombre, valor); () para una métrica sin etiquetas.
+    """
+    _colectores.append(funcion)
+    return funcion
+
+
+def exponer() -> str:
+    """Todas las métricas en el formato de texto de Prometheus"""
+    lineas = []
+    for metrica in list(_metricas.values()):
+        lineas += metrica.exponer()
+    for funcion in _colectores:
+        for nombre, tipo, ayuda, muestras in funcion():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for etiquetas, valor in muestras.items():
+                nombres = tuple(n for n, _ in etiquetas)
+                valores = tuple(v for _, v in etiquetas)
+                lineas.append(f"{nombre}{_etiquetas(nombres, valores)} {_numero(valor)}")
+    return "\n".join(lineas) + "\n"
+
+
+# ─── MIDDLEWARE HTTP ─────────────────────────
+
+_latencia_http = histograma(
+    "http_request_duration_seconds", "Latencia de los requests HTTP hasta el último byte",
+    ("metodo", "ruta", "estado"),
+)
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro (no BaseHTTPMiddleware): no envuelve la respuesta, solo mira send
+
+    La ruta es la plantilla (/portfolio/{ticker}), no la URL, así la cantidad
+    de series queda acotada. En SSE el tiempo cuenta hasta el fin del stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = scope.get("route")
+            _latencia_http.observar(
+                time.perf_counter() - inicio,
+                scope["method"], getattr(ruta, "path", "sin_ruta"), estado[0],
+            )
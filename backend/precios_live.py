@@ -0,0 +1,110 @@
+# precios_live.py
+# Refresco de precios en segundo plano y envío de cambios por WebSocket
+#
+# Una sola tarea consulta, cada INTERVALO segundos, la unión de los tickers de
+# la watchlist y del portfolio. A los clientes conectados se les manda solo lo
+# que cambió desde la vuelta anterior, así la carga sobre yfinance depende de
+# la cantidad de tickers y no de cuántos dashboards estén abiertos.
+
+import asyncio
+import logging
+import os
+from fastapi import WebSocket, WebSocketDisconnect
+from cache import obtener_infos_async
+from storage import listar_watchlist, listar_portfolio
+
+logger = logging.getLogger(__name__)
+
+INTERVALO = float(os.getenv("PRECIOS_LIVE_INTERVALO", "15"))
+
+_clientes = set()
+_ultimas = {}   # ticker -> última cotización enviada
+_despertar = None   # asyncio.Event para refrescar apenas se conecta alguien
+
+
+def resumir_cotizacion(ticker: str, info: dict) -> dict:
+    """Los campos del .info que muestra el dashboard"""
+    precio = info.get("currentPrice") or info.get("regularMarketPrice") or 0
+    apertura = info.get("open") or info.get("regularMarketOpen") or precio
+    variacion = ((precio - apertura) / apertura * 100) if apertura else 0
+    return {
+        "ticker": ticker,
+        "nombre": info.get("shortName") or ticker,
+        "precio": round(precio, 2),
+        "variacion": round(variacion, 2),
+        "moneda": info.get("currency", "USD"),
+    }
+
+
+def _tickers_seguidos() -> list:
+    tickers = listar_watchlist() + [p["ticker"] for p in listar_portfolio()]
+    return list(dict.fromkeys(tickers))
+
+
+async def _enviar(cliente: WebSocket, mensaje: dict) -> bool:
+    try:
+        await cliente.send_json(mensaje)
+        return True
+    except Exception:
+        return False
+
+
+async def _refrescar():
+    """Una vuelta: trae cotizaciones, calcula el diff y lo manda a todos"""
+    tickers = await asyncio.to_thread(_tickers_seguidos)
+    # max_edad=INTERVALO: si otro request ya trajo el dato en esta vuelta, se reusa
+    cotizaciones = await obtener_infos_async(tickers, "precio", INTERVALO)
+
+    cambios = {}
+    for ticker, resultado in cotizaciones.items():
+        if resultado["info"] is None:
+            continue
+        cotizacion = resumir_cotizacion(ticker, resultado["info"])
+        if _ultimas.get(ticker) != cotizacion:
+            _ultimas[ticker] = cotizacion
+            cambios[ticker] = cotizacion
+    for ticker in set(_ultimas) - set(cotizaciones):
+        del _ultimas[ticker]
+
+    if cambios:
+        mensaje = {"tipo": "precios", "cambios": cambios}
+        destinatarios = list(_clientes)
+        resultados = await asyncio.gather(*(_enviar(c, mensaje) for c in destinatarios))
+        for cliente, ok in zip(destinatarios, resultados):
+            if not ok:
+                _clientes.discard(cliente)
+
+
+async def loop_refresco():
+    """Tarea de fondo que corre mientras vive la app; no consulta nada si no hay clientes"""
+    global _despertar
+    _despertar = asyncio.Event()
+    while True:
+        if _clientes:
+            try:
+                await _refrescar()
+            except Exception:
+                logger.exception("Error refrescando precios")
+        try:
+            await asyncio.wait_for(_despertar.wait(), timeout=INTERVALO)
+        except asyncio.TimeoutError:
+            pass
+        _despertar.clear()
+
+
+async def atender_cliente(websocket: WebSocket):
+    """Registra al cliente, le manda el último estado conocido y espera a que se desconecte"""
+    await websocket.accept()
+    _clientes.add(websocket)
+    if _despertar is not None:
+        _despertar.set()
+    try:
+        if _ultimas:
+            await websocket.send_json({"tipo": "precios", "cambios": dict(_ultimas)})
+        # El cliente no manda nada; solo esperamos el cierre
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _clientes.discard(websocket)
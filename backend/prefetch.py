@@ -0,0 +1,112 @@
+# prefetch.py
+# Precarga especulativa: mientras Claude piensa la primera respuesta, se traen
+# las cotizaciones (y si hace falta el historial) de los tickers del mensaje
+#
+# La primera llamada a Claude tarda un segundo o más y recién ahí pide, por
+# ejemplo, obtener_precio("AAPL"). Si el mensaje ya nombraba a Apple, esa
+# descarga puede ir en paralelo: cuando llega la tool, el dato está en la
+# caché (o en vuelo, y single-flight la comparte). Se mide cuántas veces acierta.
+
+import asyncio
+import logging
+import os
+import re
+import threading
+from cache import obtener_infos_async
+from historial_precios import obtener_barras_lote
+from indicadores import BARS_INDICADORES
+from metricas import contador
+from registro import ARGUMENTOS_TICKER
+from simbolos import mencionados, normalizar
+from traza import span
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ACTIVO = os.getenv("PREFETCH", "1") == "1"
+MAX_TICKERS = int(os.getenv("PREFETCH_MAX_TICKERS", "5"))
+
+# Si el mensaje habla de esto, las tools van a leer el historial además de la cotización
+_PATRON_HISTORIAL = re.compile(
+    r"\b(rsi|tecnic\w*|media\w*|sma|ema|macd|bollinger|atr|sobrecompr\w*|sobrevend\w*|"
+    r"backtest\w*|estrategia\w*|hubiera|riesgo|volatilidad|drawdown|beta)\b"
+)
+
+_stats = {"turnos": 0, "precargados": 0, "pedidos_tools": 0, "aciertos": 0}
+_stats_lock = threading.Lock()
+# asyncio solo guarda referencias débiles a las tareas: las precargas vivas se anotan acá
+_en_curso = set()
+_tickers_metrica = contador(
+    "prefetch_tickers_total", "Tickers precargados, según si después los pidió una tool", ("resultado",)
+)
+_pedidos_metrica = contador(
+    "prefetch_pedidos_tools_total", "Tickers pedidos por tools, según si estaban precargados", ("resultado",)
+)
+
+
+def tickers_de_tools(bloques: list) -> set:
+    """Tickers que aparecen en los inputs de los tool_use"""
+    tickers = set()
+    for bloque in bloques:
+        for argumento in ARGUMENTOS_TICKER:
+            valor = bloque.input.get(argumento)
+            if isinstance(valor, str):
+                tickers.add(valor.upper())
+            elif isinstance(valor, list):
+                tickers.update(str(v).upper() for v in valor)
+    return tickers
+
+
+class Precarga:
+    """La precarga de un turno: arranca con el mensaje y se cierra al terminar la respuesta"""
+
+    def __init__(self, texto: str):
+        self.tickers = mencionados(texto, MAX_TICKERS) if PREFETCH_ACTIVO else []
+        self.con_historial = bool(_PATRON_HISTORIAL.search(normalizar(texto)))
+        self.pedidos = set()
+
+    def iniciar(self):
+        """Lanza la descarga en segundo plano; no espera a que termine"""
+        if self.tickers:
+            tarea = asyncio.create_task(self._precalentar())
+            _en_curso.add(tarea)
+            tarea.add_done_callback(_en_curso.discard)
+        return self
+
+    async def _precalentar(self):
+        with span("prefetch", tickers=self.tickers, historial=self.con_historial):
+            trabajos = [obtener_infos_async(self.tickers, "precio")]
+            if self.con_historial:
+                trabajos.append(asyncio.to_thread(obtener_barras_lote, self.tickers, BARS_INDICADORES))
+            # Los errores no importan: si falla, la tool lo va a intentar de nuevo
+            resultados = await asyncio.gather(*trabajos, return_exceptions=True)
+        for resultado in resultados:
+            if isinstance(resultado, Exception):
+                logger.debug("prefetch fallido para %s: %s", self.tickers, resultado)
+
+    def registrar_tools(self, bloques: list):
+        """Anota qué tickers pidieron las tools de una ronda"""
+        self.pedidos |= tickers_de_tools(bloques)
+
+    def cerrar(self):
+        """Fin del turno: cuenta aciertos; la descarga, si sigue, termina sola"""
+        precargados = set(self.tickers)
+        aciertos = len(precargados & self.pedidos)
+        with _stats_lock:
+            _stats["turnos"] += 1
+            _stats["precargados"] += len(precargados)
+            _stats["pedidos_tools"] += len(self.pedidos)
+            _stats["aciertos"] += aciertos
+        _tickers_metrica.sumar("usado", cantidad=aciertos)
+        _tickers_metrica.sumar("no_usado", cantidad=len(precargados) - aciertos)
+        _pedidos_metrica.sumar("precargado", cantidad=aciertos)
+        _pedidos_metrica.sumar("frio", cantidad=len(self.pedidos) - aciertos)
+
+
+def estadisticas_prefetch() -> dict:
+    """hit_rate: de los tickers que pidieron las tools, cuántos ya estaban precargados
+    precision: de los precargados, cuántos terminaron usándose"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["hit_rate"] = round(stats["aciertos"] / stats["pedidos_tools"], 4) if stats["pedidos_tools"] else 0.0
+    stats["precision"] = round(stats["aciertos"] / stats["precargados"], 4) if stats["precargados"] else 0.0
+    return stats
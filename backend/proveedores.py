@@ -0,0 +1,303 @@
+# proveedores.py
+# Fuente de datos de mercado intercambiable: yfinance, o un proveedor local reproducible
+#
+# cache.py e historial_precios.py piden cotizaciones, .info e historial a
+# través de obtener_proveedor(); nadie más importa yfinance. Con
+# PROVEEDOR_MERCADO=replay todo sale de fixtures grabados o de precios
+# sintéticos deterministas, con latencia inyectada opcional: sirve para
+# probar, medir y perfilar sin red. PROVEEDOR_MERCADO=grabar usa yfinance y
+# además guarda cada respuesta como fixture para reproducirla después.
+
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from metricas import contador, histograma
+from traza import span
+
+PROVEEDOR = os.getenv("PROVEEDOR_MERCADO", "yfinance")
+FIXTURES_DIR = Path(os.getenv("MERCADO_FIXTURES", Path(__file__).parent / "fixtures"))
+# Latencia que agrega el proveedor replay a cada llamada, para simular la red
+LATENCIA_MS = float(os.getenv("MERCADO_LATENCIA_MS", "0"))
+JITTER_MS = float(os.getenv("MERCADO_LATENCIA_JITTER_MS", "0"))
+
+_llamadas = contador("upstream_llamadas_total", "Llamadas a proveedores externos", ("proveedor", "metodo"))
+_errores = contador("upstream_errores_total", "Llamadas a proveedores externos que fallaron", ("proveedor", "metodo"))
+_latencia = histograma("upstream_duracion_segundos", "Duración de las llamadas a proveedores externos", ("proveedor", "metodo"))
+
+_COLUMNAS = ["Open", "High", "Low", "Close", "Volume"]
+# Campos de .info que alcanzan para una cotización
+_CAMPOS_COTIZACION = (
+    "shortName", "currency", "currentPrice", "regularMarketPrice", "open", "regularMarketOpen",
+    "dayHigh", "dayLow", "volume",
+)
+
+
+class ProveedorMercado:
+    """Interfaz común; las subclases implementan _info y _historial
+
+    historial devuelve un DataFrame como el de yfinance: índice de fechas y
+    columnas Open, High, Low, Close, Volume. Cada llamada queda contada en
+    estadisticas(), con los errores aparte.
+    """
+
+    nombre = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}   # método -> {"llamadas", "errores"}
+
+    def _contar(self, metodo: str, funcion, *args):
+        inicio = time.perf_counter()
+        try:
+            with span(f"{self.nombre}.{metodo}", ticker=args[0]):
+                return funcion(*args)
+        except Exception:
+            self._sumar(metodo, "errores")
+            _errores.sumar(self.nombre, metodo)
+            raise
+        finally:
+            self._sumar(metodo, "llamadas")
+            _llamadas.sumar(self.nombre, metodo)
+            _latencia.observar(time.perf_counter() - inicio, self.nombre, metodo)
+
+    def _sumar(self, metodo: str, contador: str):
+        with self._lock:
+            stats = self._stats.setdefault(metodo, {"llamadas": 0, "errores": 0})
+            stats[contador] += 1
+
+    def info(self, ticker: str) -> dict:
+        return self._contar("info", self._info, ticker.upper())
+
+    def cotizacion(self, ticker: str) -> dict:
+        """Solo los campos de precio del .info"""
+        info = self.info(ticker)
+        return {c: info.get(c) for c in _CAMPOS_COTIZACION}
+
+    def historial(self, ticker: str, periodo: str = None, desde: str = None) -> pd.DataFrame:
+        """Bars diarios de los últimos `periodo` (ej "5y", "6mo") o desde la fecha `desde` inclusive"""
+        return self._contar("historial", self._historial, ticker.upper(), periodo, desde)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {"proveedor": self.nombre, **{m: dict(s) for m, s in self._stats.items()}}
+
+    def _info(self, ticker: str) -> dict:
+        raise NotImplementedError
+
+    def _historial(self, ticker: str, periodo: str, desde: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+# ─── YFINANCE ────────────────────────────────
+
+class YFinanceProveedor(ProveedorMercado):
+    nombre = "yfinance"
+
+    def __init__(self):
+        super().__init__()
+        # Import acá: con el proveedor replay no hace falta tener yfinance instalado
+        import yfinance
+        self._yf = yfinance
+
+    def _info(self, ticker: str) -> dict:
+        return self._yf.Ticker(ticker).info
+
+    def _historial(self, ticker: str, periodo: str, desde: str) -> pd.DataFrame:
+        activo = self._yf.Ticker(ticker)
+        if desde:
+            return activo.history(start=desde)
+        return activo.history(period=periodo or "1y")
+
+
+class GrabadorProveedor(YFinanceProveedor):
+    """yfinance, guardando cada respuesta en FIXTURES_DIR para el proveedor replay"""
+
+    nombre = "grabar"
+
+    def _info(self, ticker: str) -> dict:
+        info = super()._info(ticker)
+        FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+        with open(FIXTURES_DIR / f"{_nombre_archivo(ticker)}.json", "w") as f:
+            json.dump(info, f, ensure_ascii=False, default=str)
+        return info
+
+    def _historial(self, ticker: str, periodo: str, desde: str) -> pd.DataFrame:
+        hist = super()._historial(ticker, periodo, desde)
+        # Solo las descargas completas sirven como fixture (las incrementales son un pedazo)
+        if not desde and not hist.empty:
+            FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+            indice = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+            hist[_COLUMNAS].set_axis(indice.normalize()).to_csv(
+                FIXTURES_DIR / f"{_nombre_archivo(ticker)}.csv", index_label="Date"
+            )
+        return hist
+
+
+# ─── REPLAY / SINTÉTICO ──────────────────────
+
+# Los caminos sintéticos arrancan siempre en esta fecha: el precio de un día
+# dado es el mismo en todas las corridas, así las actualizaciones incrementales cierran
+INICIO_SINTETICO = "2000-01-03"
+
+
+def _nombre_archivo(ticker: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
+
+
+def _desde_periodo(periodo: str, hasta: pd.Timestamp) -> pd.Timestamp:
+    """'5y', '6mo', '10d', 'max' → fecha de inicio"""
+    if not periodo or periodo == "max":
+        return pd.Timestamp(INICIO_SINTETICO)
+    for sufijo, unidad in (("mo", "months"), ("y", "years"), ("wk", "weeks"), ("d", "days")):
+        if periodo.endswith(sufijo):
+            return hasta - pd.DateOffset(**{unidad: int(periodo[:-len(sufijo)])})
+    raise ValueError(f"Período no soportado: {periodo}")
+
+
+@lru_cache(maxsize=1024)
+def _camino_sintetico(ticker: str, hasta: str) -> pd.DataFrame:
+    """Random walk geométrico con semilla fija por ticker, en días hábiles hasta `hasta`"""
+    semilla = zlib.crc32(ticker.encode())
+    rng = np.random.default_rng(semilla)
+    fechas = pd.bdate_range(INICIO_SINTETICO, hasta)
+    n = len(fechas)
+    # Cada ticker con su propio drift, volatilidad y precio inicial, pero siempre los mismos
+    vol = rng.uniform(0.008, 0.025)
+    # Drift chico y compensado por la volatilidad, para que 25 años no den precios absurdos
+    drift = rng.uniform(-0.0001, 0.0003) - vol ** 2 / 2
+    inicial = rng.uniform(5, 500)
+    # Cuatro ruidos por día, generados día por día: agregar días no cambia los anteriores
+    ruido = np.random.default_rng(semilla + 1).standard_normal(n * 4).reshape(n, 4).T
+    cierres = inicial * np.exp(np.cumsum(drift + vol * ruido[0]))
+    aperturas = np.concatenate([[inicial], cierres[:-1]]) * (1 + vol / 4 * ruido[1])
+    maximos = np.maximum(aperturas, cierres) * (1 + np.abs(vol / 2 * ruido[2]))
+    minimos = np.minimum(aperturas, cierres) * (1 - np.abs(vol / 2 * ruido[3]))
+    volumen = np.round(rng.uniform(1e5, 5e7) * np.exp(ruido[2] / 3))
+    return pd.DataFrame(
+        {"Open": aperturas, "High": maximos, "Low": minimos, "Close": cierres, "Volume": volumen},
+        index=fechas,
+    )
+
+
+class ReplayProveedor(ProveedorMercado):
+    """Sin red: reproduce fixtures de FIXTURES_DIR o genera precios sintéticos deterministas
+
+    Un ticker con <TICKER>.json / <TICKER>.csv en el directorio de fixtures
+    devuelve eso; cualquier otro ticker con forma de símbolo obtiene un camino
+    sintético estable. `latencia_ms` (± `jitter_ms`) se duerme en cada llamada.
+    """
+
+    nombre = "replay"
+
+    def __init__(self, directorio: Path = None, latencia_ms: float = None, jitter_ms: float = None):
+        super().__init__()
+        self.directorio = Path(directorio or FIXTURES_DIR)
+        self.latencia_ms = LATENCIA_MS if latencia_ms is None else latencia_ms
+        self.jitter_ms = JITTER_MS if jitter_ms is None else jitter_ms
+        # Jitter reproducible entre corridas
+        self._azar = random.Random(0)
+
+    def _esperar(self):
+        if self.latencia_ms or self.jitter_ms:
+            with self._lock:
+                jitter = self._azar.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(self.latencia_ms + jitter, 0) / 1000)
+
+    def _fixture(self, ticker: str, extension: str):
+        archivo = self.directorio / f"{_nombre_archivo(ticker)}.{extension}"
+        return archivo if archivo.exists() else None
+
+    def _bars(self, ticker: str) -> pd.DataFrame:
+        fixture = self._fixture(ticker, "csv")
+        if fixture is not None:
+            return pd.read_csv(fixture, index_col="Date", parse_dates=True)
+        # Como yfinance: un símbolo que no existe no trae historia
+        if not ticker.replace("-", "").replace("^", "").replace(".", "").replace("=", "").isalnum():
+            return pd.DataFrame(columns=_COLUMNAS, index=pd.DatetimeIndex([]), dtype=np.float64)
+        return _camino_sintetico(ticker, date.today().isoformat())
+
+    def _info(self, ticker: str) -> dict:
+        self._esperar()
+        fixture = self._fixture(ticker, "json")
+        if fixture is not None:
+            with open(fixture) as f:
+                return json.load(f)
+
+        bars = self._bars(ticker)
+        if bars.empty:
+            # yfinance devuelve un .info casi vacío para los tickers inexistentes
+            return {"trailingPegRatio": None}
+        ultimo = bars.iloc[-1]
+        anio = bars["Close"].iloc[-252:]
+        azar = random.Random(zlib.crc32(ticker.encode()))
+        return {
+            "symbol": ticker,
+            "shortName": f"{ticker} Sintético",
+            "longName": f"{ticker} Sintético S.A.",
+            "currency": "USD",
+            "sector": azar.choice(["Technology", "Financial Services", "Energy", "Healthcare", "Consumer Cyclical"]),
+            "industry": "Sintética",
+            "currentPrice": round(float(ultimo["Close"]), 2),
+            "regularMarketPrice": round(float(ultimo["Close"]), 2),
+            "open": round(float(ultimo["Open"]), 2),
+            "dayHigh": round(float(ultimo["High"]), 2),
+            "dayLow": round(float(ultimo["Low"]), 2),
+            "volume": int(ultimo["Volume"]),
+            "marketCap": int(ultimo["Close"] * azar.uniform(1e8, 5e9)),
+            "trailingPE": round(azar.uniform(8, 60), 2),
+            "dividendYield": round(azar.uniform(0, 0.05), 4),
+            "fiftyTwoWeekHigh": round(float(anio.max()), 2),
+            "fiftyTwoWeekLow": round(float(anio.min()), 2),
+            "longBusinessSummary": f"Activo sintético generado localmente para {ticker}.",
+        }
+
+    def _historial(self, ticker: str, periodo: str, desde: str) -> pd.DataFrame:
+        self._esperar()
+        bars = self._bars(ticker)
+        if bars.empty:
+            return bars
+        inicio = pd.Timestamp(desde) if desde else _desde_periodo(periodo or "1y", bars.index[-1])
+        return bars.loc[bars.index >= inicio]
+
+
+# ─── SELECCIÓN ───────────────────────────────
+
+_PROVEEDORES = {
+    "yfinance": YFinanceProveedor,
+    "grabar": GrabadorProveedor,
+    "replay": ReplayProveedor,
+}
+
+_proveedor = None
+_proveedor_lock = threading.Lock()
+
+
+def obtener_proveedor() -> ProveedorMercado:
+    """El proveedor elegido con PROVEEDOR_MERCADO, creado la primera vez que se pide"""
+    global _proveedor
+    if _proveedor is None:
+        with _proveedor_lock:
+            if _proveedor is None:
+                if PROVEEDOR not in _PROVEEDORES:
+                    raise ValueError(f"PROVEEDOR_MERCADO desconocido: {PROVEEDOR}. Opciones: {', '.join(_PROVEEDORES)}")
+                _proveedor = _PROVEEDORES[PROVEEDOR]()
+    return _proveedor
+
+
+def usar_proveedor(proveedor: ProveedorMercado):
+    """Reemplaza el proveedor en uso (benchmarks, pruebas)"""
+    global _proveedor
+    with _proveedor_lock:
+        _proveedor = proveedor
+
+
+def estadisticas_proveedor() -> dict:
+    return obtener_proveedor().estadisticas()
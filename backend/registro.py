@@ -0,0 +1,116 @@
+# registro.py
+# Registro declarativo de herramientas: el schema para Claude sale de la propia función
+
+import inspect
+import json
+import os
+import time
+from cache import TTLCache, TTL_POR_TIPO
+from metricas import histograma
+from traza import span, anotar
+
+# Ventana en la que una llamada idéntica a una tool cacheable reusa el resultado.
+# Se suma a la antigüedad de la cotización cacheada, así que no pasa del TTL de precios
+TTL_MEMO = min(float(os.getenv("TOOLS_TTL_MEMO", "30")), TTL_POR_TIPO["precio"])
+# Argumentos que nombran tickers: se normalizan antes de llamar y de armar la clave del memo
+ARGUMENTOS_TICKER = ("ticker", "ticker1", "ticker2", "tickers", "benchmark")
+# Así empiezan las respuestas de tools que no resolvieron el pedido; no se memorizan
+PREFIJOS_NO_CONCLUYENTES = ("Error", "No se pudo", "No hay suficiente")
+
+_herramientas = {}   # nombre -> dict(funcion, schema, cacheable), en orden de registro
+_memo = TTLCache(int(os.getenv("TOOLS_MAX_MEMO", "256")))
+# resultado: ok, error (texto de error o excepción) o memo (salió de _memo)
+_duracion = histograma("tool_duracion_segundos", "Duración de cada ejecución de tool", ("tool", "resultado"))
+
+
+def herramienta(descripcion: str, parametros: dict = None, cacheable: bool = False):
+    """Decorador que registra una función como tool del agente
+
+    `parametros` mapea cada argumento de la función a su JSON schema
+    (type, description, ...). Los argumentos sin valor por defecto quedan
+    como required. Con cacheable=True, las llamadas con los mismos inputs
+    dentro de TTL_MEMO segundos devuelven el resultado anterior.
+    """
+    parametros = parametros or {}
+
+    def decorar(funcion):
+        firma = inspect.signature(funcion)
+        faltantes = set(firma.parameters) - set(parametros)
+        if faltantes:
+            raise ValueError(f"{funcion.__name__}: falta el schema de {', '.join(sorted(faltantes))}")
+
+        _herramientas[funcion.__name__] = {
+            "funcion": funcion,
+            "cacheable": cacheable,
+            "schema": {
+                "name": funcion.__name__,
+                "description": descripcion,
+                "input_schema": {
+                    "type": "object",
+                    "properties": parametros,
+                    **({"required": [
+                        nombre for nombre, p in firma.parameters.items()
+                        if p.default is inspect.Parameter.empty
+                    ]} if parametros else {}),
+                },
+            },
+        }
+        return funcion
+
+    return decorar
+
+
+def schemas() -> list:
+    """Lista de tools en el formato que espera la API de Claude"""
+    return [h["schema"] for h in _herramientas.values()]
+
+
+def concluyente(resultado: str) -> bool:
+    """Si la salida de una tool es un resultado (y no un error o un dato faltante)"""
+    return not resultado.startswith(PREFIJOS_NO_CONCLUYENTES)
+
+
+def _normalizar_inputs(inputs: dict) -> dict:
+    """Tickers sin espacios y en mayúsculas: "aapl" y "AAPL" son la misma llamada"""
+    def _ticker(valor):
+        if isinstance(valor, str):
+            return valor.strip().upper()
+        if isinstance(valor, list):
+            return [str(v).strip().upper() for v in valor]
+        return valor
+    return {k: _ticker(v) if k in ARGUMENTOS_TICKER else v for k, v in inputs.items()}
+
+
+def ejecutar(nombre: str, inputs: dict) -> str:
+    """Ejecuta la herramienta registrada con ese nombre"""
+    registrada = _herramientas.get(nombre)
+    if registrada is None:
+        return f"Herramienta '{nombre}' no encontrada"
+
+    inputs = _normalizar_inputs(inputs)
+    with span(f"tool.{nombre}", inputs=inputs):
+        inicio = time.perf_counter()
+        etiqueta = "error"
+        try:
+            if not registrada["cacheable"]:
+                resultado = registrada["funcion"](**inputs)
+            else:
+                clave = (nombre, json.dumps(inputs, sort_keys=True))
+                resultado = _memo.obtener(clave, TTL_MEMO)
+                if resultado is not None:
+                    etiqueta = "memo"
+                    return resultado
+                resultado = registrada["funcion"](**inputs)
+                # Las tools devuelven los errores como texto: esos no se memorizan
+                if concluyente(resultado):
+                    _memo.guardar(clave, resultado)
+            if concluyente(resultado):
+                etiqueta = "ok"
+            return resultado
+        finally:
+            _duracion.observar(time.perf_counter() - inicio, nombre, etiqueta)
+            anotar(resultado=etiqueta)
+
+
+def estadisticas_memo() -> dict:
+    return _memo.estadisticas()
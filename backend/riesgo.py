@@ -0,0 +1,178 @@
+# riesgo.py
+# Métricas de riesgo del portfolio calculadas en bloque sobre la matriz de retornos
+#
+# Todo sale de una sola matriz (días × posiciones) de retornos diarios
+# alineados por fecha: pesos, volatilidad, correlaciones, beta contra el
+# benchmark, máximo drawdown y VaR/CVaR histórico. No hay loops por posición,
+# así que 100+ posiciones cuestan lo mismo que unas pocas multiplicaciones
+# de matrices (el historial se lee del disco, ver historial_precios.py).
+
+import os
+import numpy as np
+import pandas as pd
+from historial_precios import obtener_barras_lote, FECHA, CIERRE
+from storage import listar_portfolio
+
+BENCHMARK = os.getenv("RIESGO_BENCHMARK", "SPY")
+DIAS_RIESGO = int(os.getenv("RIESGO_DIAS", "252"))
+NIVEL_VAR = float(os.getenv("RIESGO_NIVEL_VAR", "0.95"))
+# Fracción mínima de la ventana que tiene que cubrir el historial de una posición;
+# las que cotizan hace menos (recién listadas) van a "sin_datos" en vez de achicar la ventana de todas
+MIN_COBERTURA = float(os.getenv("RIESGO_MIN_COBERTURA", "0.8"))
+DIAS_POR_ANIO = 252
+
+
+def _cierres_por_fecha(barras: dict) -> pd.DataFrame:
+    """DataFrame (fechas × tickers) de cierres; cada ticker queda en su fecha real"""
+    columnas = {
+        ticker: pd.Series(b[CIERRE], index=b[FECHA].astype(np.int64))
+        for ticker, b in barras.items()
+    }
+    return pd.DataFrame(columnas).sort_index()
+
+
+def _max_drawdown(retornos: np.ndarray) -> np.ndarray:
+    """Peor caída desde un máximo, por columna (o escalar si es una sola serie)"""
+    curva = np.cumprod(1 + retornos, axis=0)
+    picos = np.maximum(np.maximum.accumulate(curva, axis=0), 1.0)
+    return np.min(curva / picos - 1, axis=0)
+
+
+def _pares_extremos(correlacion: np.ndarray, tickers: list, cantidad: int = 3) -> list:
+    """Los pares más correlacionados, leyendo solo el triángulo superior"""
+    filas, columnas = np.triu_indices(len(tickers), k=1)
+    valores = correlacion[filas, columnas]
+    orden = np.argsort(-np.nan_to_num(valores, nan=-np.inf))[:cantidad]
+    return [
+        {"par": [tickers[filas[i]], tickers[columnas[i]]], "correlacion": round(float(valores[i]), 3)}
+        for i in orden
+    ]
+
+
+def analizar_portfolio(posiciones: list = None, benchmark: str = None, dias: int = None) -> dict:
+    """Calcula el riesgo del portfolio con los últimos `dias` retornos diarios
+
+    `posiciones` son dicts {ticker, cantidad} (por defecto las guardadas).
+    Los pesos salen del valor de mercado al último cierre. Devuelve un dict
+    con los totales del portfolio, el detalle por posición y la matriz de
+    correlación; las posiciones sin historial (o con menos de MIN_COBERTURA
+    de la ventana) van en "sin_datos".
+    """
+    posiciones = listar_portfolio() if posiciones is None else posiciones
+    benchmark = (benchmark or BENCHMARK).upper()
+    dias = dias or DIAS_RIESGO
+
+    cantidades = {}
+    for pos in posiciones:
+        ticker = pos["ticker"].upper()
+        cantidades[ticker] = cantidades.get(ticker, 0) + pos["cantidad"]
+    if not cantidades:
+        return {"error": "El portfolio está vacío"}
+
+    # Bars de sobra: las cripto cotizan todos los días y cubren menos fechas hábiles por bar
+    barras = obtener_barras_lote(list(cantidades) + [benchmark], dias=dias * 3 // 2 + 1)
+    sin_datos = [
+        t for t, b in barras.items()
+        if t in cantidades and (isinstance(b, Exception) or b.shape[1] < 2)
+    ]
+    tickers = [t for t in cantidades if t not in sin_datos]
+    if not tickers:
+        return {"error": "No hay historial para ninguna posición", "sin_datos": sin_datos}
+
+    bench = barras.get(benchmark)
+    hay_benchmark = not isinstance(bench, Exception) and bench.shape[1] >= 2
+    columnas = list(dict.fromkeys(tickers + ([benchmark] if hay_benchmark else [])))
+    cierres = _cierres_por_fecha({t: barras[t] for t in columnas})
+
+    # Con benchmark, el calendario es el suyo (las cripto cotizan los fines de semana);
+    # los huecos de cada activo se completan con su último cierre
+    if hay_benchmark:
+        cierres = cierres.ffill().loc[cierres[benchmark].notna()]
+    else:
+        cierres = cierres.ffill()
+    retornos_df = cierres.pct_change().iloc[1:].iloc[-dias:]
+
+    # Un dropna por fila recortaría la ventana de todas al historial más corto
+    minimo = max(2, int(len(retornos_df) * MIN_COBERTURA))
+    cortos = [t for t in tickers if retornos_df[t].count() < minimo]
+    if cortos:
+        sin_datos += cortos
+        tickers = [t for t in tickers if t not in cortos]
+        columnas = [t for t in columnas if t not in cortos or t == benchmark]
+        if not tickers:
+            return {"error": "Ninguna posición tiene historial suficiente", "sin_datos": sin_datos}
+    retornos_df = retornos_df[columnas].dropna()
+    if len(retornos_df) < 2:
+        return {"error": "Historial insuficiente para calcular riesgo", "sin_datos": sin_datos}
+
+    r_bench = retornos_df[benchmark].to_numpy() if hay_benchmark else None
+    retornos = retornos_df[tickers].to_numpy()
+
+    # ── Pesos por valor de mercado al último cierre ──
+    ultimos = cierres[tickers].iloc[-1].to_numpy()
+    valores = ultimos * np.array([cantidades[t] for t in tickers])
+    valor_total = valores.sum()
+    pesos = valores / valor_total if valor_total else np.full(len(tickers), 1 / len(tickers))
+
+    # ── Volatilidad y contribución al riesgo ──
+    covarianza = np.atleast_2d(np.cov(retornos, rowvar=False))
+    varianza = float(pesos @ covarianza @ pesos)
+    vol_anual = np.sqrt(varianza * DIAS_POR_ANIO)
+    vol_activos = np.sqrt(np.diag(covarianza) * DIAS_POR_ANIO)
+    contribucion = pesos * (covarianza @ pesos) / varianza if varianza else np.zeros(len(tickers))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        desvios = np.sqrt(np.diag(covarianza))
+        correlacion = covarianza / np.outer(desvios, desvios)
+
+    # ── Serie del portfolio (pesos constantes) ──
+    r_port = retornos @ pesos
+    cuantil = np.quantile(r_port, 1 - NIVEL_VAR)
+    var = -cuantil
+    cvar = -r_port[r_port <= cuantil].mean()
+
+    # ── Beta contra el benchmark, todas las posiciones de una ──
+    betas = np.full(len(tickers), np.nan)
+    beta_port = None
+    if r_bench is not None:
+        desvio_bench = r_bench - r_bench.mean()
+        var_bench = desvio_bench @ desvio_bench
+        if var_bench:
+            betas = (retornos - retornos.mean(axis=0)).T @ desvio_bench / var_bench
+            beta_port = round(float(pesos @ betas), 3)
+
+    drawdowns = _max_drawdown(retornos)
+
+    def _r(x, decimales=4):
+        return None if x is None or np.isnan(x) else round(float(x), decimales)
+
+    return {
+        "dias": len(r_port),
+        "desde": str(np.datetime64(int(retornos_df.index[0]), "D")),
+        "hasta": str(np.datetime64(int(retornos_df.index[-1]), "D")),
+        "benchmark": benchmark if r_bench is not None else None,
+        "nivel_var": NIVEL_VAR,
+        "valor_total": round(float(valor_total), 2),
+        "volatilidad_anual": _r(vol_anual),
+        "beta": beta_port,
+        "max_drawdown": _r(_max_drawdown(r_port)),
+        "var_diario": _r(var),
+        "cvar_diario": _r(cvar),
+        "posiciones": [
+            {
+                "ticker": t,
+                "peso": _r(pesos[i]),
+                "volatilidad_anual": _r(vol_activos[i]),
+                "beta": _r(betas[i], 3),
+                "contribucion_riesgo": _r(contribucion[i]),
+                "max_drawdown": _r(drawdowns[i]),
+            }
+            for i, t in enumerate(tickers)
+        ],
+        "correlacion": {
+            "tickers": tickers,
+            "matriz": np.round(np.nan_to_num(correlacion), 3).tolist(),
+        },
+        "pares_mas_correlacionados": _pares_extremos(correlacion, tickers) if len(tickers) > 1 else [],
+        "sin_datos": sin_datos,
+    }
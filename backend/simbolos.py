@@ -0,0 +1,154 @@
+# simbolos.py
+# Índice local de símbolos: validación sin red, caché negativa y búsqueda por nombre
+
+import os
+import re
+import time
+import unicodedata
+from cache import obtener_info
+from storage import obtener_simbolo, guardar_simbolo, buscar_simbolos, marcar_invalido, es_invalido
+
+# Un ticker válido se vuelve a chequear upstream recién después de este tiempo
+TTL_VALIDO = float(os.getenv("SIMBOLOS_TTL_VALIDO", str(30 * 24 * 3600)))
+# Un ticker inexistente (typo) no se vuelve a consultar durante este tiempo
+TTL_INVALIDO = float(os.getenv("SIMBOLOS_TTL_INVALIDO", str(24 * 3600)))
+
+# Nombres comunes → ticker, para resolver sin red lo que el usuario escribe en castellano
+ALIAS = {
+    "apple": "AAPL",
+    "microsoft": "MSFT",
+    "google": "GOOGL",
+    "alphabet": "GOOGL",
+    "amazon": "AMZN",
+    "tesla": "TSLA",
+    "meta": "META",
+    "facebook": "META",
+    "nvidia": "NVDA",
+    "netflix": "NFLX",
+    "disney": "DIS",
+    "coca cola": "KO",
+    "coca-cola": "KO",
+    "mercadolibre": "MELI",
+    "mercado libre": "MELI",
+    "ypf": "YPF",
+    "galicia": "GGAL",
+    "globant": "GLOB",
+    "bitcoin": "BTC-USD",
+    "ethereum": "ETH-USD",
+    "s&p 500": "SPY",
+    "s&p500": "SPY",
+    "sp500": "SPY",
+    "nasdaq": "QQQ",
+    "merval": "^MERV",
+    "oro": "GLD",
+}
+
+
+# Siglas en mayúsculas que aparecen en los mensajes y no son tickers
+NO_TICKERS = {
+    "RSI", "SMA", "EMA", "MACD", "ATR", "ETF", "ETFS", "USD", "ARS", "EUR", "PE", "EPS", "CEO", "IPO",
+    "VAR", "CVAR", "OK", "EEUU", "USA", "AI", "IA", "YTD", "TNA", "TEA", "CEDEAR", "CEDEARS", "BCRA",
+}
+_PATRON_ALIAS = re.compile(
+    r"(?<![a-z0-9])(" + "|".join(re.escape(a) for a in sorted(ALIAS, key=len, reverse=True)) + r")(?![a-z0-9])"
+)
+# Cuerpo de hasta 6 caracteres, sufijo de clase o mercado opcional (BRK.B, GGAL.BA) y de
+# par (BTC-USD); el punto final de una oración ("$TSLA.") no es parte del ticker
+_PATRON_TICKER = re.compile(
+    r"(?<![\w^$.])(\$?)(\^?[A-Za-z][A-Za-z0-9]{0,5}(?:\.[A-Za-z]{1,2})?(?:-[A-Za-z]{2,4})?)(?![\w.-]?[A-Za-z0-9])"
+)
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos, para comparar nombres"""
+    sin_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return " ".join(sin_acentos.lower().split())
+
+
+def validar(ticker: str) -> bool:
+    """True si el ticker existe y cotiza
+
+    Resuelve con el índice local si puede; solo consulta upstream la primera
+    vez (o cuando venció el dato). Los inexistentes quedan en la caché negativa.
+    """
+    ticker = ticker.upper()
+    ahora = time.time()
+
+    conocido = obtener_simbolo(ticker)
+    if conocido and ahora - conocido["validado_en"] < TTL_VALIDO:
+        return True
+    if es_invalido(ticker, ahora):
+        return False
+
+    try:
+        info = obtener_info(ticker)
+    except Exception:
+        # Un error de red no dice nada del ticker: no lo marcamos como inválido
+        return False
+
+    precio = info.get("currentPrice") or info.get("regularMarketPrice")
+    if precio is None or precio <= 0:
+        marcar_invalido(ticker, ahora + TTL_INVALIDO)
+        return False
+
+    nombre = info.get("longName") or info.get("shortName") or ticker
+    guardar_simbolo(ticker, nombre, normalizar(nombre), info.get("currency"), ahora)
+    return True
+
+
+def buscar(texto: str, limite: int = 8) -> list:
+    """Símbolos conocidos que coinciden con el texto, por ticker, alias o nombre (sin red)"""
+    texto = texto.strip()
+    if not texto:
+        return []
+    norm = normalizar(texto)
+
+    resultados = []
+    alias = ALIAS.get(norm)
+    if alias:
+        conocido = obtener_simbolo(alias) or {"nombre": texto, "moneda": None}
+        resultados.append({"ticker": alias, "nombre": conocido["nombre"], "moneda": conocido["moneda"]})
+    for simbolo in buscar_simbolos(texto.upper(), norm, limite):
+        if all(r["ticker"] != simbolo["ticker"] for r in resultados):
+            resultados.append(simbolo)
+    return resultados[:limite]
+
+
+def resolver(texto: str):
+    """Ticker más probable para un texto ("Apple" → AAPL), o None si no hay ninguno conocido"""
+    coincidencias = buscar(texto, limite=1)
+    return coincidencias[0]["ticker"] if coincidencias else None
+
+
+def mencionados(texto: str, limite: int = 5) -> list:
+    """Tickers que aparecen en un mensaje libre, sin ir a la red
+
+    Reconoce alias ("apple", "mercado libre"), cashtags ($AAPL) y palabras en
+    mayúsculas que ya estén en el índice de símbolos. Una palabra en mayúsculas
+    desconocida ("HOLA, QUE TAL") no cuenta: iría upstream en cada mensaje.
+    Es una heurística: puede errar, sirve para adelantar trabajo.
+    """
+    encontrados = [ALIAS[a] for a in _PATRON_ALIAS.findall(normalizar(texto))]
+    ahora = time.time()
+    for cashtag, palabra in _PATRON_TICKER.findall(texto):
+        ticker = palabra.upper()
+        if cashtag:
+            if not es_invalido(ticker, ahora):
+                encontrados.append(ticker)
+        elif palabra == ticker and ticker not in NO_TICKERS and obtener_simbolo(ticker):
+            encontrados.append(ticker)
+    return list(dict.fromkeys(encontrados))[:limite]
+
+
+def exacto(texto: str):
+    """Ticker que corresponde exactamente al texto (ticker conocido, alias o nombre completo), o None
+
+    A diferencia de resolver() no acepta coincidencias parciales: "app" no es AAPL.
+    """
+    norm = normalizar(texto)
+    if norm in ALIAS:
+        return ALIAS[norm]
+    for simbolo in buscar(texto):
+        if simbolo["ticker"] == texto.strip().upper() or normalizar(simbolo["nombre"]) == norm:
+            return simbolo["ticker"]
+    return None
@@ -0,0 +1,243 @@
+# storage.py
+# Persistencia de watchlist, portfolio, índice de símbolos y fundamentales en SQLite (modo WAL)
+#
+# Cada operación es una transacción atómica, así dos requests concurrentes
+# (o varios workers de uvicorn) no se pisan las escrituras.
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DB_FILE = Path(os.getenv("DB_PATH", Path(__file__).parent / "agente.db"))
+
+# Archivos JSON de la versión anterior; se importan una sola vez
+WATCHLIST_JSON = Path(__file__).parent / "watchlist.json"
+PORTFOLIO_JSON = Path(__file__).parent / "portfolio.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    ticker TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS portfolio (
+    ticker        TEXT PRIMARY KEY,
+    cantidad      REAL NOT NULL,
+    precio_compra REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS simbolos (
+    ticker      TEXT PRIMARY KEY,
+    nombre      TEXT NOT NULL,
+    nombre_norm TEXT NOT NULL,
+    moneda      TEXT,
+    validado_en REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS simbolos_invalidos (
+    ticker TEXT PRIMARY KEY,
+    expira REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fundamentales (
+    ticker      TEXT PRIMARY KEY,
+    datos       TEXT NOT NULL,
+    fecha       TEXT NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+_local = threading.local()
+_inicializado = False
+_init_lock = threading.Lock()
+
+# ─── CONEXIÓN ────────────────────────────────
+
+def _conexion() -> sqlite3.Connection:
+    """Una conexión por thread (sqlite3 no comparte conexiones entre threads)"""
+    conexion = getattr(_local, "conexion", None)
+    if conexion is None:
+        # isolation_level=None: las transacciones las abrimos a mano con BEGIN IMMEDIATE
+        conexion = sqlite3.connect(DB_FILE, timeout=10, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.execute("PRAGMA busy_timeout=10000")
+        _local.conexion = conexion
+    _inicializar(conexion)
+    return conexion
+
+@contextmanager
+def _transaccion():
+    """Transacción de escritura: BEGIN IMMEDIATE toma el lock de escritura de entrada"""
+    conexion = _conexion()
+    conexion.execute("BEGIN IMMEDIATE")
+    try:
+        yield conexion
+        conexion.execute("COMMIT")
+    except BaseException:
+        conexion.execute("ROLLBACK")
+        raise
+
+def _inicializar(conexion: sqlite3.Connection):
+    global _inicializado
+    if _inicializado:
+        return
+    with _init_lock:
+        if _inicializado:
+            return
+        conexion.executescript(_SCHEMA)
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            _migrar_json(conexion)
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        _inicializado = True
+
+def _migrar_json(conexion: sqlite3.Connection):
+    """Importa watchlist.json y portfolio.json la primera vez (dentro de la transacción de init)"""
+    if conexion.execute("SELECT 1 FROM meta WHERE clave = 'migrado_json'").fetchone():
+        return
+
+    if WATCHLIST_JSON.exists():
+        with open(WATCHLIST_JSON, "r") as f:
+            tickers = json.load(f)
+        conexion.executemany(
+            "INSERT OR IGNORE INTO watchlist (ticker) VALUES (?)",
+            [(t.upper(),) for t in tickers]
+        )
+    if PORTFOLIO_JSON.exists():
+        with open(PORTFOLIO_JSON, "r") as f:
+            posiciones = json.load(f)
+        conexion.executemany(
+            "INSERT OR REPLACE INTO portfolio (ticker, cantidad, precio_compra) VALUES (?, ?, ?)",
+            [(p["ticker"].upper(), p["cantidad"], p["precio_compra"]) for p in posiciones]
+        )
+    conexion.execute("INSERT INTO meta (clave, valor) VALUES ('migrado_json', datetime('now'))")
+
+# ─── WATCHLIST ───────────────────────────────
+
+def listar_watchlist() -> list:
+    """Tickers en el orden en que se agregaron"""
+    filas = _conexion().execute("SELECT ticker FROM watchlist ORDER BY rowid").fetchall()
+    return [f["ticker"] for f in filas]
+
+def en_watchlist(ticker: str) -> bool:
+    fila = _conexion().execute("SELECT 1 FROM watchlist WHERE ticker = ?", (ticker.upper(),)).fetchone()
+    return fila is not None
+
+def agregar_watchlist(ticker: str) -> bool:
+    """Agrega el ticker; devuelve False si ya estaba"""
+    with _transaccion() as conexion:
+        cursor = conexion.execute("INSERT OR IGNORE INTO watchlist (ticker) VALUES (?)", (ticker.upper(),))
+        return cursor.rowcount > 0
+
+def eliminar_watchlist(ticker: str) -> bool:
+    """Elimina el ticker; devuelve False si no estaba"""
+    with _transaccion() as conexion:
+        cursor = conexion.execute("DELETE FROM watchlist WHERE ticker = ?", (ticker.upper(),))
+        return cursor.rowcount > 0
+
+# ─── PORTFOLIO ───────────────────────────────
+
+def listar_portfolio() -> list:
+    """Posiciones como dicts {ticker, cantidad, precio_compra}, en orden de alta"""
+    filas = _conexion().execute(
+        "SELECT ticker, cantidad, precio_compra FROM portfolio ORDER BY rowid"
+    ).fetchall()
+    return [dict(f) for f in filas]
+
+def guardar_posicion(ticker: str, cantidad: float, precio_compra: float) -> bool:
+    """Crea o actualiza la posición; devuelve True si es nueva"""
+    ticker = ticker.upper()
+    with _transaccion() as conexion:
+        existia = conexion.execute("SELECT 1 FROM portfolio WHERE ticker = ?", (ticker,)).fetchone()
+        conexion.execute(
+            """INSERT INTO portfolio (ticker, cantidad, precio_compra) VALUES (?, ?, ?)
+               ON CONFLICT(ticker) DO UPDATE SET
+                   cantidad = excluded.cantidad,
+                   precio_compra = excluded.precio_compra""",
+            (ticker, cantidad, precio_compra)
+        )
+        return existia is None
+
+def eliminar_posicion(ticker: str) -> bool:
+    """Elimina la posición; devuelve False si no existía"""
+    with _transaccion() as conexion:
+        cursor = conexion.execute("DELETE FROM portfolio WHERE ticker = ?", (ticker.upper(),))
+        return cursor.rowcount > 0
+
+# ─── ÍNDICE DE SÍMBOLOS ──────────────────────
+
+def obtener_simbolo(ticker: str):
+    """Dict {ticker, nombre, moneda, validado_en} o None si no está en el índice"""
+    fila = _conexion().execute(
+        "SELECT ticker, nombre, moneda, validado_en FROM simbolos WHERE ticker = ?", (ticker.upper(),)
+    ).fetchone()
+    return dict(fila) if fila else None
+
+def guardar_simbolo(ticker: str, nombre: str, nombre_norm: str, moneda: str, validado_en: float):
+    with _transaccion() as conexion:
+        conexion.execute(
+            """INSERT INTO simbolos (ticker, nombre, nombre_norm, moneda, validado_en) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(ticker) DO UPDATE SET
+                   nombre = excluded.nombre,
+                   nombre_norm = excluded.nombre_norm,
+                   moneda = excluded.moneda,
+                   validado_en = excluded.validado_en""",
+            (ticker.upper(), nombre, nombre_norm, moneda, validado_en)
+        )
+        conexion.execute("DELETE FROM simbolos_invalidos WHERE ticker = ?", (ticker.upper(),))
+
+def buscar_simbolos(ticker_prefijo: str, nombre_norm: str, limite: int) -> list:
+    """Símbolos cuyo ticker empieza con el prefijo (por el índice) o cuyo nombre contiene el texto"""
+    filas = _conexion().execute(
+        """SELECT ticker, nombre, moneda FROM simbolos
+           WHERE (ticker >= ? AND ticker < ? || char(1114111)) OR nombre_norm LIKE ?
+           ORDER BY ticker = ? DESC, ticker >= ? AND ticker < ? || char(1114111) DESC, length(ticker)
+           LIMIT ?""",
+        (ticker_prefijo, ticker_prefijo, f"%{nombre_norm}%",
+         ticker_prefijo, ticker_prefijo, ticker_prefijo, limite)
+    ).fetchall()
+    return [dict(f) for f in filas]
+
+def marcar_invalido(ticker: str, expira: float):
+    with _transaccion() as conexion:
+        conexion.execute(
+            "INSERT OR REPLACE INTO simbolos_invalidos (ticker, expira) VALUES (?, ?)",
+            (ticker.upper(), expira)
+        )
+
+def es_invalido(ticker: str, ahora: float) -> bool:
+    fila = _conexion().execute(
+        "SELECT 1 FROM simbolos_invalidos WHERE ticker = ? AND expira > ?", (ticker.upper(), ahora)
+    ).fetchone()
+    return fila is not None
+
+# ─── FUNDAMENTALES ───────────────────────────
+
+def obtener_fundamentales(tickers: list) -> dict:
+    """{ticker: {datos, fecha, actualizado}} de los tickers que tienen snapshot"""
+    tickers = [t.upper() for t in tickers]
+    if not tickers:
+        return {}
+    filas = _conexion().execute(
+        f"SELECT ticker, datos, fecha, actualizado FROM fundamentales WHERE ticker IN ({','.join('?' * len(tickers))})",
+        tickers
+    ).fetchall()
+    return {
+        f["ticker"]: {"datos": json.loads(f["datos"]), "fecha": f["fecha"], "actualizado": f["actualizado"]}
+        for f in filas
+    }
+
+def guardar_fundamentales(snapshots: dict, fecha: str, actualizado: float):
+    """Reemplaza los snapshots {ticker: datos} en una sola transacción"""
+    with _transaccion() as conexion:
+        conexion.executemany(
+            "INSERT OR REPLACE INTO fundamentales (ticker, datos, fecha, actualizado) VALUES (?, ?, ?, ?)",
+            [(t.upper(), json.dumps(d, ensure_ascii=False), fecha, actualizado) for t, d in snapshots.items()]
+        )
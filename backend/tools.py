@@ -1,21 +1,31 @@
 # tools.py
 # Herramientas financieras del agente
 
-import yfinance as yf
-import numpy as np
 import json
 from datetime import datetime
+from cache import obtener_info
+from registro import herramienta, schemas, ejecutar
+from simbolos import buscar
+from indicadores import indicadores_de_tickers
+from riesgo import analizar_portfolio, BENCHMARK
+from backtest import backtest, ESTRATEGIAS, ANIOS_DEFAULT, MAX_ANIOS
+from fundamentales import obtener as obtener_fundamentales
 from watchlist import agregar_ticker, eliminar_ticker, obtener_watchlist
 
 # ─────────────────────────────────────────
 # FUNCIONES
 # ─────────────────────────────────────────
+# Cada @herramienta registra la función como tool del agente (ver registro.py)
 
+@herramienta(
+    "Obtiene el precio actual, variación del día y datos clave de una acción, ETF o cripto. Usar cuando el usuario pregunta por el precio o cotización de un activo.",
+    {"ticker": {"type": "string", "description": "El símbolo del activo. Ejemplos: AAPL (Apple), SPY (ETF S&P500), BTC-USD (Bitcoin), MELI (MercadoLibre)"}},
+    cacheable=True,
+)
 def obtener_precio(ticker: str) -> str:
     """Obtiene el precio actual y datos clave de un activo"""
     try:
-        activo = yf.Ticker(ticker.upper())
-        info = activo.info
+        info = obtener_info(ticker)
 
         nombre = info.get("longName") or info.get("shortName") or ticker.upper()
         precio = info.get("currentPrice") or info.get("regularMarketPrice")
@@ -49,27 +59,32 @@ def obtener_precio(ticker: str) -> str:
         return f"Error al obtener datos de {ticker}: {str(e)}"
 
 
+@herramienta(
+    "Obtiene información fundamental de una empresa o ETF: sector, market cap, P/E ratio, dividendos, descripción.",
+    {"ticker": {"type": "string", "description": "El símbolo del activo. Ejemplos: AAPL, MSFT, SPY"}},
+    cacheable=True,
+)
 def obtener_info_fundamental(ticker: str) -> str:
     """Obtiene información fundamental de una empresa o ETF"""
     try:
-        activo = yf.Ticker(ticker.upper())
-        info = activo.info
-
-        nombre = info.get("longName") or info.get("shortName") or ticker.upper()
-        sector = info.get("sector", "N/A")
-        industria = info.get("industry", "N/A")
-        descripcion = info.get("longBusinessSummary", "Sin descripción disponible.")
-        market_cap = info.get("marketCap")
-        pe_ratio = info.get("trailingPE")
-        dividend_yield = info.get("dividendYield")
-        semana_52_max = info.get("fiftyTwoWeekHigh")
-        semana_52_min = info.get("fiftyTwoWeekLow")
+        # Snapshot diario guardado (ver fundamentales.py): no espera a la red salvo la primera vez
+        datos = obtener_fundamentales(ticker)
+
+        nombre = datos["nombre"] or ticker.upper()
+        sector = datos["sector"]
+        industria = datos["industria"]
+        descripcion = datos["descripcion"]
+        market_cap = datos["market_cap"]
+        pe_ratio = datos["pe"]
+        dividend_yield = datos["dividend_yield"]
+        semana_52_max = datos["max_52"]
+        semana_52_min = datos["min_52"]
 
         resultado = f"📋 **{nombre} ({ticker.upper()})**\n"
 
-        if sector != "N/A":
+        if sector:
             resultado += f"🏭 Sector: {sector}\n"
-        if industria != "N/A":
+        if industria:
             resultado += f"🔧 Industria: {industria}\n"
         if market_cap:
             resultado += f"💎 Market Cap: ${market_cap:,.0f}\n"
@@ -79,9 +94,10 @@ def obtener_info_fundamental(ticker: str) -> str:
             resultado += f"💵 Dividendo: {dividend_yield*100:.2f}%\n"
         if semana_52_max and semana_52_min:
             resultado += f"📅 Rango 52 semanas: {semana_52_min:.2f} - {semana_52_max:.2f}\n"
+        resultado += f"🗓️ Datos al {datos['fecha']}\n"
 
-        if descripcion and descripcion != "Sin descripción disponible.":
-            resultado += f"\n📝 {descripcion[:300]}..."
+        if descripcion:
+            resultado += f"\n📝 {descripcion}..."
 
         return resultado.strip()
 
@@ -89,12 +105,19 @@ def obtener_info_fundamental(ticker: str) -> str:
         return f"Error al obtener info de {ticker}: {str(e)}"
 
 
+@herramienta(
+    "Compara dos activos entre sí mostrando precio y variación del día de ambos.",
+    {
+        "ticker1": {"type": "string", "description": "Símbolo del primer activo"},
+        "ticker2": {"type": "string", "description": "Símbolo del segundo activo"},
+    },
+    cacheable=True,
+)
 def comparar_activos(ticker1: str, ticker2: str) -> str:
     """Compara dos activos entre sí"""
     try:
         def get_data(ticker):
-            t = yf.Ticker(ticker.upper())
-            info = t.info
+            info = obtener_info(ticker)
             precio = info.get("currentPrice") or info.get("regularMarketPrice", 0)
             apertura = info.get("open") or info.get("regularMarketOpen", precio)
             variacion = ((precio - apertura) / apertura * 100) if apertura else 0
@@ -120,58 +143,42 @@ def comparar_activos(ticker1: str, ticker2: str) -> str:
         return f"Error al comparar activos: {str(e)}"
 
 
+@herramienta(
+    "Calcula indicadores técnicos de un activo: RSI (14 períodos), SMA20 y SMA50. Usar cuando el usuario pide análisis técnico, RSI, medias móviles o quiere saber si un activo está sobrecomprado/sobrevendido.",
+    {"ticker": {"type": "string", "description": "El símbolo del activo. Ejemplos: AAPL, BTC-USD, SPY, MELI"}},
+    cacheable=True,
+)
 def obtener_analisis_tecnico(ticker: str) -> str:
-    """Calcula RSI, SMA20 y SMA50 para un activo"""
+    """Calcula RSI (Wilder), SMA20 y SMA50 para un activo"""
     try:
-        activo = yf.Ticker(ticker.upper())
-        info = activo.info
-        nombre = info.get("shortName") or ticker.upper()
-        moneda = info.get("currency", "USD")
-
-        # Descargar 100 días de historial
-        hist = activo.history(period="100d")
-        if hist.empty or len(hist) < 20:
+        # Nombre y moneda son solo para mostrar: sin fundamentales, el ticker y USD
+        try:
+            fundamentales = obtener_fundamentales(ticker)
+        except Exception:
+            fundamentales = {"nombre_corto": None, "moneda": None}
+        nombre = fundamentales["nombre_corto"] or ticker.upper()
+        moneda = fundamentales["moneda"] or "USD"
+
+        # Indicadores sobre el historial local (solo baja los bars que faltan)
+        ind = indicadores_de_tickers([ticker])[ticker.upper()]
+        if "error" in ind:
             return f"No hay suficiente historial para calcular indicadores de {ticker.upper()}."
 
-        cierres = hist["Close"].values
-
-        # ── Precio actual ──
-        precio_actual = float(cierres[-1])
-
-        # ── RSI (14 períodos) ──
-        deltas = np.diff(cierres)
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        avg_gain = np.mean(gains[-14:])
-        avg_loss = np.mean(losses[-14:])
-        if avg_loss == 0:
-            rsi = 100.0
-        else:
-            rs = avg_gain / avg_loss
-            rsi = round(100 - (100 / (1 + rs)), 2)
-
-        # ── SMA20 y SMA50 ──
-        sma20 = round(float(np.mean(cierres[-20:])), 2)
-        sma50 = round(float(np.mean(cierres[-50:])), 2) if len(cierres) >= 50 else None
+        precio_actual = ind["precio"]
+        sma20 = ind["sma20"]
+        sma50 = ind["sma50"]
 
         # ── Señales ──
-        if rsi >= 70:
-            rsi_signal = "sobrecomprado"
-        elif rsi <= 30:
-            rsi_signal = "sobrevendido"
-        else:
-            rsi_signal = "neutral"
-
         sma20_signal = "arriba" if precio_actual > sma20 else "abajo"
         sma50_signal = ("arriba" if precio_actual > sma50 else "abajo") if sma50 else None
 
         datos = {
             "ticker": ticker.upper(),
             "nombre": nombre,
-            "precio": round(precio_actual, 2),
+            "precio": precio_actual,
             "moneda": moneda,
-            "rsi": rsi,
-            "rsi_signal": rsi_signal,
+            "rsi": ind["rsi"],
+            "rsi_signal": ind["rsi_signal"],
             "sma20": sma20,
             "sma20_signal": sma20_signal,
             "sma50": sma50,
@@ -184,14 +191,171 @@ def obtener_analisis_tecnico(ticker: str) -> str:
         return f"Error al calcular indicadores de {ticker}: {str(e)}"
 
 
+@herramienta(
+    "Calcula indicadores técnicos de varios activos a la vez: RSI de Wilder (14), MACD (12, 26, 9), bandas de Bollinger (20, 2), ATR (14), SMA50 y SMA200. Usar cuando el usuario pide análisis técnico de más de un activo o de toda su watchlist.",
+    {"tickers": {"type": "array", "items": {"type": "string"}, "description": "Lista de símbolos. Ejemplo: [\"AAPL\", \"MSFT\", \"GOOG\"]"}},
+    cacheable=True,
+)
+def analisis_tecnico_multiple(tickers: list) -> str:
+    """Calcula RSI, MACD, Bollinger, ATR y medias para varios activos a la vez"""
+    try:
+        resultados = indicadores_de_tickers(tickers)
+        filas = []
+        for ticker, ind in resultados.items():
+            if "error" in ind:
+                filas.append(f"| {ticker} | sin datos | | | | | |")
+                continue
+            def fmt(clave, patron="{:.2f}"):
+                return patron.format(ind[clave]) if ind[clave] is not None else "N/A"
+            filas.append(
+                f"| {ticker} | {fmt('precio')} | {fmt('rsi', '{:.1f}')} ({ind['rsi_signal']}) "
+                f"| {fmt('macd_hist', '{:+.3f}')} | {fmt('bollinger_inf')} - {fmt('bollinger_sup')} "
+                f"| {fmt('atr')} | {fmt('sma50')} / {fmt('sma200')} |"
+            )
+        return (
+            "📊 **Análisis técnico**\n\n"
+            "| Ticker | Precio | RSI (14) | MACD hist | Bollinger (20, 2) | ATR (14) | SMA50 / SMA200 |\n"
+            "|---|---|---|---|---|---|---|\n" + "\n".join(filas)
+        )
+
+    except Exception as e:
+        return f"Error al calcular indicadores: {str(e)}"
+
+
+@herramienta(
+    "Analiza el riesgo del portfolio del usuario con el último año de retornos diarios: pesos, volatilidad anual, beta contra un benchmark, máximo drawdown, VaR/CVaR histórico diario, contribución de cada posición al riesgo y los pares más correlacionados. Usar cuando pregunta qué tan riesgoso o diversificado está su portfolio.",
+    {"benchmark": {"type": "string", "description": f"Índice contra el que se calcula la beta. Por defecto {BENCHMARK}"}},
+)
+def analizar_riesgo_portfolio(benchmark: str = BENCHMARK) -> str:
+    """Resume las métricas de riesgo del portfolio guardado"""
+    try:
+        r = analizar_portfolio(benchmark=benchmark)
+        if "error" in r:
+            return f"No se pudo analizar el portfolio: {r['error']}"
+
+        def pct(valor):
+            return f"{valor * 100:.2f}%" if valor is not None else "N/A"
+
+        nivel = f"{r['nivel_var'] * 100:g}%"
+        resultado = (
+            f"🛡️ **Riesgo del portfolio** ({r['dias']} días, {r['desde']} a {r['hasta']})\n"
+            f"💼 Valor: {r['valor_total']:,.2f}\n"
+            f"📉 Volatilidad anual: {pct(r['volatilidad_anual'])}\n"
+            f"📐 Beta vs {r['benchmark'] or 'N/A'}: {r['beta'] if r['beta'] is not None else 'N/A'}\n"
+            f"🕳️ Máximo drawdown: {pct(r['max_drawdown'])}\n"
+            f"⚠️ VaR diario {nivel}: {pct(r['var_diario'])} | CVaR: {pct(r['cvar_diario'])}\n\n"
+            "| Ticker | Peso | Vol. anual | Beta | Aporte al riesgo | Máx. drawdown |\n"
+            "|---|---|---|---|---|---|\n"
+        )
+        # Las más pesadas primero; con portfolios grandes el resto no aporta a la respuesta
+        posiciones = sorted(r["posiciones"], key=lambda p: -(p["peso"] or 0))
+        for p in posiciones[:15]:
+            resultado += (
+                f"| {p['ticker']} | {pct(p['peso'])} | {pct(p['volatilidad_anual'])} "
+                f"| {p['beta'] if p['beta'] is not None else 'N/A'} | {pct(p['contribucion_riesgo'])} "
+                f"| {pct(p['max_drawdown'])} |\n"
+            )
+        if len(posiciones) > 15:
+            resultado += f"\n…y {len(posiciones) - 15} posiciones más.\n"
+        if r["pares_mas_correlacionados"]:
+            pares = ", ".join(f"{a}/{b} ({p['correlacion']:.2f})" for p in r["pares_mas_correlacionados"] for a, b in [p["par"]])
+            resultado += f"\n🔗 Más correlacionados: {pares}\n"
+        if r["sin_datos"]:
+            resultado += f"\nSin historial suficiente (no entran en el cálculo): {', '.join(r['sin_datos'])}\n"
+        return resultado.strip()
+
+    except Exception as e:
+        return f"Error al analizar el riesgo del portfolio: {str(e)}"
+
+
+@herramienta(
+    "Simula estrategias sobre el historial diario de uno o varios activos y las compara con comprar y mantener: cruce de medias (comprado mientras la SMA rápida está sobre la lenta) o RSI (compra cuando el RSI baja de `entrada`, vende cuando supera `salida`). Usar cuando el usuario pregunta '¿qué hubiera pasado si...?' con una regla de compra/venta. Con optimizar=true prueba una grilla de parámetros y devuelve la mejor combinación por Sharpe.",
+    {
+        "tickers": {"type": "array", "items": {"type": "string"}, "description": "Símbolos a simular. Ejemplo: [\"AAPL\", \"SPY\"]"},
+        "estrategia": {"type": "string", "enum": list(ESTRATEGIAS), "description": "cruce_sma o rsi"},
+        "parametro1": {"type": "integer", "description": "cruce_sma: período de la media rápida (default 20). rsi: nivel de entrada (default 30)"},
+        "parametro2": {"type": "integer", "description": "cruce_sma: período de la media lenta (default 50). rsi: nivel de salida (default 70)"},
+        "anios": {"type": "integer", "description": f"Años de historia a simular (default {ANIOS_DEFAULT}"
+                  + (f", máximo {MAX_ANIOS})" if MAX_ANIOS else ")")},
+        "optimizar": {"type": "boolean", "description": "Si es true ignora los parámetros y barre la grilla de combinaciones"},
+    },
+    cacheable=True,
+)
+def backtest_estrategia(tickers: list, estrategia: str, parametro1: int = None, parametro2: int = None,
+                        anios: int = ANIOS_DEFAULT, optimizar: bool = False) -> str:
+    """Corre el backtest y lo resume en una tabla contra comprar y mantener"""
+    try:
+        parametros = None
+        if parametro1 is not None or parametro2 is not None:
+            default = ESTRATEGIAS[estrategia]["default"] if estrategia in ESTRATEGIAS else (None, None)
+            parametros = (
+                default[0] if parametro1 is None else parametro1,
+                default[1] if parametro2 is None else parametro2,
+            )
+        resultados = backtest(tickers, estrategia, parametros, optimizar=optimizar, anios=anios)
+
+        def pct(valor):
+            return f"{valor * 100:+.1f}%" if valor is not None else "N/A"
+
+        filas = []
+        for ticker, r in resultados.items():
+            if "error" in r:
+                filas.append(f"| {ticker} | sin datos | | | | | |")
+                continue
+            params = ", ".join(f"{k}={v}" for k, v in r["parametros"].items())
+            mantener = r["comprar_y_mantener"]
+            filas.append(
+                f"| {ticker} | {params} | {pct(r['retorno_total'])} (CAGR {pct(r['cagr'])}) "
+                f"| {r['sharpe'] if r['sharpe'] is not None else 'N/A'} | {pct(r['max_drawdown'])} "
+                f"| {r['operaciones']} | {pct(mantener['retorno_total'])} (DD {pct(mantener['max_drawdown'])}) |"
+            )
+        # El período real sale de los bars: puede ser menos que lo pedido (historial corto o MAX_ANIOS)
+        simulados = [r for r in resultados.values() if "error" not in r]
+        periodo = f"{min(r['desde'] for r in simulados)} a {max(r['hasta'] for r in simulados)}" if simulados else "sin datos"
+        if MAX_ANIOS and anios and anios > MAX_ANIOS:
+            periodo += f"; pediste {anios} años, el historial disponible llega a {MAX_ANIOS}"
+        titulo = "🧪 **Backtest " + ("optimizado " if optimizar else "") + f"{estrategia}** ({periodo}, costo por operación incluido)"
+        return (
+            f"{titulo}\n\n"
+            "| Ticker | Parámetros | Retorno | Sharpe | Máx. drawdown | Operaciones | Comprar y mantener |\n"
+            "|---|---|---|---|---|---|---|\n" + "\n".join(filas) +
+            "\n\nResultados pasados, no garantizan rendimientos futuros."
+        )
+
+    except Exception as e:
+        return f"Error al correr el backtest: {str(e)}"
+
+
+@herramienta(
+    "Busca el ticker de una empresa, ETF o cripto por nombre o parte del símbolo en el índice local (ej: 'Apple' → AAPL). Usar cuando no estás seguro del símbolo exacto.",
+    {"consulta": {"type": "string", "description": "Nombre o símbolo a buscar. Ej: Apple, Mercado Libre, BTC"}},
+)
+def buscar_ticker(consulta: str) -> str:
+    """Resuelve nombres a tickers con el índice local de símbolos"""
+    resultados = buscar(consulta)
+    if not resultados:
+        return f"No encontré símbolos conocidos para '{consulta}'. Probá con el ticker directamente."
+    lineas = [f"- {r['ticker']}: {r['nombre']}" + (f" ({r['moneda']})" if r["moneda"] else "") for r in resultados]
+    return f"🔎 Coincidencias para '{consulta}':\n" + "\n".join(lineas)
+
+
+@herramienta(
+    "Agrega un activo a la watchlist del usuario. Usar cuando dice 'agregá X a mi watchlist' o 'seguí X'.",
+    {"ticker": {"type": "string", "description": "Símbolo del activo. Ej: AAPL, BTC-USD, SPY"}},
+)
 def agregar_a_watchlist(ticker: str) -> str:
     """Agrega un ticker a la watchlist del usuario"""
     return agregar_ticker(ticker)
 
+@herramienta(
+    "Elimina un activo de la watchlist del usuario. Usar cuando dice 'sacá X de mi watchlist' o 'dejá de seguir X'.",
+    {"ticker": {"type": "string", "description": "Símbolo del activo a eliminar"}},
+)
 def eliminar_de_watchlist(ticker: str) -> str:
     """Elimina un ticker de la watchlist del usuario"""
     return eliminar_ticker(ticker)
 
+@herramienta("Muestra los activos que el usuario tiene en su watchlist.")
 def ver_watchlist() -> str:
     """Devuelve la watchlist actual del usuario"""
     tickers = obtener_watchlist()
@@ -199,6 +363,7 @@ def ver_watchlist() -> str:
         return "Tu watchlist está vacía. Podés agregar activos diciéndome 'agregá AAPL a mi watchlist'."
     return f"Tu watchlist tiene: {', '.join(tickers)}"
 
+@herramienta("Devuelve la fecha y hora actual.")
 def obtener_hora() -> str:
     """Devuelve la fecha y hora actual"""
     ahora = datetime.now()
@@ -209,125 +374,10 @@ def obtener_hora() -> str:
 # DEFINICIÓN PARA LA API DE CLAUDE
 # ─────────────────────────────────────────
 
-TOOLS = [
-    {
-        "name": "obtener_precio",
-        "description": "Obtiene el precio actual, variación del día y datos clave de una acción, ETF o cripto. Usar cuando el usuario pregunta por el precio o cotización de un activo.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "ticker": {
-                    "type": "string",
-                    "description": "El símbolo del activo. Ejemplos: AAPL (Apple), SPY (ETF S&P500), BTC-USD (Bitcoin), MELI (MercadoLibre)"
-                }
-            },
-            "required": ["ticker"]
-        }
-    },
-    {
-        "name": "obtener_info_fundamental",
-        "description": "Obtiene información fundamental de una empresa o ETF: sector, market cap, P/E ratio, dividendos, descripción.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "ticker": {
-                    "type": "string",
-                    "description": "El símbolo del activo. Ejemplos: AAPL, MSFT, SPY"
-                }
-            },
-            "required": ["ticker"]
-        }
-    },
-    {
-        "name": "comparar_activos",
-        "description": "Compara dos activos entre sí mostrando precio y variación del día de ambos.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "ticker1": {
-                    "type": "string",
-                    "description": "Símbolo del primer activo"
-                },
-                "ticker2": {
-                    "type": "string",
-                    "description": "Símbolo del segundo activo"
-                }
-            },
-            "required": ["ticker1", "ticker2"]
-        }
-    },
-    {
-        "name": "obtener_analisis_tecnico",
-        "description": "Calcula indicadores técnicos de un activo: RSI (14 períodos), SMA20 y SMA50. Usar cuando el usuario pide análisis técnico, RSI, medias móviles o quiere saber si un activo está sobrecomprado/sobrevendido.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "ticker": {
-                    "type": "string",
-                    "description": "El símbolo del activo. Ejemplos: AAPL, BTC-USD, SPY, MELI"
-                }
-            },
-            "required": ["ticker"]
-        }
-    },
-    {
-        "name": "agregar_a_watchlist",
-        "description": "Agrega un activo a la watchlist del usuario. Usar cuando dice 'agregá X a mi watchlist' o 'seguí X'.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "ticker": {"type": "string", "description": "Símbolo del activo. Ej: AAPL, BTC-USD, SPY"}
-            },
-            "required": ["ticker"]
-        }
-    },
-    {
-        "name": "eliminar_de_watchlist",
-        "description": "Elimina un activo de la watchlist del usuario. Usar cuando dice 'sacá X de mi watchlist' o 'dejá de seguir X'.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "ticker": {"type": "string", "description": "Símbolo del activo a eliminar"}
-            },
-            "required": ["ticker"]
-        }
-    },
-    {
-        "name": "ver_watchlist",
-        "description": "Muestra los activos que el usuario tiene en su watchlist.",
-        "input_schema": {
-            "type": "object",
-            "properties": {}
-        }
-    },
-    {
-        "name": "obtener_hora",
-        "description": "Devuelve la fecha y hora actual.",
-        "input_schema": {
-            "type": "object",
-            "properties": {}
-        }
-    }
-]
+# Los schemas salen de los @herramienta de arriba, en el orden en que están definidas
+TOOLS = schemas()
 
 
 def ejecutar_tool(nombre: str, inputs: dict) -> str:
     """Ejecuta la herramienta correspondiente"""
-    if nombre == "obtener_precio":
-        return obtener_precio(inputs["ticker"])
-    elif nombre == "obtener_info_fundamental":
-        return obtener_info_fundamental(inputs["ticker"])
-    elif nombre == "comparar_activos":
-        return comparar_activos(inputs["ticker1"], inputs["ticker2"])
-    elif nombre == "obtener_analisis_tecnico":
-        return obtener_analisis_tecnico(inputs["ticker"])
-    elif nombre == "agregar_a_watchlist":
-        return agregar_a_watchlist(inputs["ticker"])
-    elif nombre == "eliminar_de_watchlist":
-        return eliminar_de_watchlist(inputs["ticker"])
-    elif nombre == "ver_watchlist":
-        return ver_watchlist()
-    elif nombre == "obtener_hora":
-        return obtener_hora()
-    else:
-        return f"Herramienta '{nombre}' no encontrada"
+    return ejecutar(nombre, inputs)
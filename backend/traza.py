@@ -0,0 +1,143 @@
+# traza.py
+# Trazas opcionales por request: árbol de spans del loop del agente
+#
+# Se activan por request (header X-Trace: 1) o para todos con TRAZAS=1.
+# El span actual viaja en un contextvar: las corrutinas y asyncio.to_thread
+# lo heredan solos; los pools de threads propios tienen que copiar el
+# contexto al mandar trabajo (ver agent._ejecutar_tool y cache.obtener_infos).
+# Sin traza activa, span() no hace más que leer el contextvar.
+#
+# Las trazas guardan inputs de tools de todas las sesiones: /debug/trazas solo
+# responde si TRAZAS_TOKEN está definido y el request trae ese token.
+
+import contextvars
+import hmac
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+TRAZAS_SIEMPRE = os.getenv("TRAZAS", "0") == "1"
+MAX_TRAZAS = int(os.getenv("TRAZAS_MAX", "100"))
+# Token para leer las trazas (header X-Debug-Token); sin token, /debug/trazas no existe
+TOKEN_DEBUG = os.getenv("TRAZAS_TOKEN", "")
+# Los inputs de las tools y otros atributos largos se recortan a este largo
+LARGO_ATRIBUTO = 300
+
+_span_actual = contextvars.ContextVar("span_actual", default=None)
+_trazas = OrderedDict()   # id -> dict ya serializado, las más nuevas al final
+_trazas_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("nombre", "atributos", "inicio", "fin", "error", "hijos", "hilo")
+
+    def __init__(self, nombre: str, atributos: dict):
+        self.nombre = nombre
+        self.atributos = atributos
+        self.inicio = time.perf_counter()
+        self.fin = None
+        self.error = None
+        self.hijos = []
+        self.hilo = threading.current_thread().name
+
+    def a_dict(self, origen: float) -> dict:
+        return {
+            "nombre": self.nombre,
+            "inicio_ms": round((self.inicio - origen) * 1000, 2),
+            "duracion_ms": round(((self.fin or time.perf_counter()) - self.inicio) * 1000, 2),
+            "hilo": self.hilo,
+            **({"atributos": self.atributos} if self.atributos else {}),
+            **({"error": self.error} if self.error else {}),
+            **({"hijos": [h.a_dict(origen) for h in self.hijos]} if self.hijos else {}),
+        }
+
+
+def _recortar(valor):
+    if isinstance(valor, (int, float, bool)) or valor is None:
+        return valor
+    texto = valor if isinstance(valor, str) else repr(valor)
+    return texto if len(texto) <= LARGO_ATRIBUTO else texto[:LARGO_ATRIBUTO] + "…"
+
+
+@contextmanager
+def _abrir(nombre: str, padre: Span, atributos: dict):
+    actual = Span(nombre, {k: _recortar(v) for k, v in atributos.items()})
+    # list.append es atómico: spans de distintos threads pueden colgarse del mismo padre
+    padre.hijos.append(actual)
+    token = _span_actual.set(actual)
+    try:
+        yield actual
+    except BaseException as e:
+        actual.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        actual.fin = time.perf_counter()
+        _span_actual.reset(token)
+
+
+def span(nombre: str, **atributos):
+    """Context manager que abre un span hijo del actual; no hace nada si no hay traza activa"""
+    padre = _span_actual.get()
+    if padre is None:
+        return nullcontext()
+    return _abrir(nombre, padre, atributos)
+
+
+def anotar(**atributos):
+    """Agrega atributos al span actual (ej: tokens de una respuesta ya recibida)"""
+    actual = _span_actual.get()
+    if actual is not None:
+        actual.atributos.update({k: _recortar(v) for k, v in atributos.items()})
+
+
+def pedida(header: str = None) -> bool:
+    """Si este request se traza: TRAZAS=1 o header X-Trace con 1/true"""
+    return TRAZAS_SIEMPRE or (header or "").lower() in ("1", "true", "si", "sí")
+
+
+def autorizado(token: str = None) -> bool:
+    """Si el request puede leer las trazas guardadas"""
+    return bool(TOKEN_DEBUG) and hmac.compare_digest((token or "").encode(), TOKEN_DEBUG.encode())
+
+
+@contextmanager
+def traza(nombre: str, activa: bool = True, traza_id: str = None, **atributos):
+    """Abre la raíz de una traza y la guarda al cerrar; devuelve el id (o None si no está activa)"""
+    if not activa:
+        yield None
+        return
+
+    traza_id = traza_id or uuid.uuid4().hex[:16]
+    raiz = Span(nombre, {k: _recortar(v) for k, v in atributos.items()})
+    fecha = datetime.now().isoformat(timespec="milliseconds")
+    token = _span_actual.set(raiz)
+    try:
+        yield traza_id
+    except BaseException as e:
+        raiz.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        raiz.fin = time.perf_counter()
+        _span_actual.reset(token)
+        with _trazas_lock:
+            _trazas[traza_id] = {"id": traza_id, "fecha": fecha, **raiz.a_dict(raiz.inicio)}
+            while len(_trazas) > MAX_TRAZAS:
+                _trazas.popitem(last=False)
+
+
+def obtener_traza(traza_id: str):
+    with _trazas_lock:
+        return _trazas.get(traza_id)
+
+
+def listar_trazas() -> list:
+    """Resumen de las trazas guardadas, la más nueva primero"""
+    with _trazas_lock:
+        return [
+            {"id": t["id"], "fecha": t["fecha"], "nombre": t["nombre"], "duracion_ms": t["duracion_ms"]}
+            for t in reversed(_trazas.values())
+        ]
@@ -1,54 +1,33 @@
 # watchlist.py
-# Manejo de la watchlist persistida en JSON
+# Manejo de la watchlist persistida en SQLite (ver storage.py)
 
-import json
-import yfinance as yf
-from pathlib import Path
-
-WATCHLIST_FILE = Path(__file__).parent / "watchlist.json"
-
-def _leer() -> list:
-    if not WATCHLIST_FILE.exists():
-        return []
-    with open(WATCHLIST_FILE, "r") as f:
-        return json.load(f)
-
-def _guardar(tickers: list):
-    with open(WATCHLIST_FILE, "w") as f:
-        json.dump(tickers, f)
+from simbolos import validar
+from storage import listar_watchlist, en_watchlist, agregar_watchlist, eliminar_watchlist
 
 def _validar_ticker(ticker: str) -> bool:
-    """Verifica que el ticker existe en yfinance y tiene precio"""
-    try:
-        info = yf.Ticker(ticker).info
-        precio = info.get("currentPrice") or info.get("regularMarketPrice")
-        return precio is not None and precio > 0
-    except Exception:
-        return False
+    """Verifica que el ticker existe y tiene precio (con el índice local de símbolos)"""
+    return validar(ticker)
 
 def obtener_watchlist() -> list:
-    return _leer()
+    return listar_watchlist()
 
 def agregar_ticker(ticker: str) -> str:
-    tickers = _leer()
     ticker = ticker.upper()
 
-    if ticker in tickers:
+    if en_watchlist(ticker):
         return f"{ticker} ya está en tu watchlist."
 
     # Validar que el ticker existe antes de agregarlo
     if not _validar_ticker(ticker):
         return f"❌ No encontré el ticker '{ticker}'. Verificá que el símbolo sea correcto (ej: AAPL, BTC-USD, SPY)."
 
-    tickers.append(ticker)
-    _guardar(tickers)
+    # Otro request pudo haberlo agregado mientras validábamos
+    if not agregar_watchlist(ticker):
+        return f"{ticker} ya está en tu watchlist."
     return f"{ticker} agregado a tu watchlist. ✅"
 
 def eliminar_ticker(ticker: str) -> str:
-    tickers = _leer()
     ticker = ticker.upper()
-    if ticker not in tickers:
+    if not eliminar_watchlist(ticker):
         return f"{ticker} no está en tu watchlist."
-    tickers.remove(ticker)
-    _guardar(tickers)
     return f"{ticker} eliminado de tu watchlist. 🗑️"
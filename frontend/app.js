@@ -1,6 +1,10 @@
 const API_URL = 'https://agente1-production.up.railway.app/chat';
 const BASE_URL = 'https://agente1-production.up.railway.app';
 
+// Id de sesión propio de este navegador: el backend separa el historial por sesión
+const SESION_ID = localStorage.getItem('sesion_id') || crypto.randomUUID();
+localStorage.setItem('sesion_id', SESION_ID);
+
 const chatContainer = document.getElementById('chatContainer');
 const inputMensaje  = document.getElementById('inputMensaje');
 const btnEnviar     = document.getElementById('btnEnviar');
@@ -229,6 +233,47 @@ function quitarTyping() {
 }
 
 // ─── ENVIAR MENSAJE ──────────────────────────
+const NOMBRES_TOOLS = {
+  obtener_precio: 'Consultando precio',
+  obtener_info_fundamental: 'Buscando fundamentales',
+  comparar_activos: 'Comparando activos',
+  obtener_analisis_tecnico: 'Calculando indicadores',
+  analisis_tecnico_multiple: 'Calculando indicadores',
+  analizar_riesgo_portfolio: 'Analizando el riesgo del portfolio',
+  backtest_estrategia: 'Corriendo el backtest',
+  agregar_a_watchlist: 'Actualizando watchlist',
+  eliminar_de_watchlist: 'Actualizando watchlist',
+  ver_watchlist: 'Leyendo watchlist',
+  buscar_ticker: 'Buscando el ticker',
+  obtener_hora: 'Consultando la hora',
+};
+
+// Lee un stream SSE de un fetch POST y llama a onEvento(nombre, datos) por cada evento
+async function leerSSE(res, onEvento) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let corte;
+    while ((corte = buffer.indexOf('\n\n')) !== -1) {
+      const bloque = buffer.slice(0, corte);
+      buffer = buffer.slice(corte + 2);
+      let evento = 'message';
+      let data = '';
+      for (const linea of bloque.split('\n')) {
+        if (linea.startsWith('event: ')) evento = linea.slice(7);
+        else if (linea.startsWith('data: ')) data += linea.slice(6);
+      }
+      if (data) onEvento(evento, JSON.parse(data));
+    }
+  }
+}
+
 async function enviarMensaje() {
   const texto = inputMensaje.value.trim();
   if (!texto) return;
@@ -240,15 +285,51 @@ async function enviarMensaje() {
   mostrarTyping();
 
   try {
-    const res = await fetch(API_URL, {
+    const res = await fetch(`${BASE_URL}/chat/stream`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ texto })
+      body: JSON.stringify({ texto, sesion_id: SESION_ID })
     });
 
-    const data = await res.json();
-    quitarTyping();
-    agregarMensaje(data.respuesta, 'bot');
+    let acumulado = '';
+    let bubble = null;
+
+    // La burbuja del bot se crea con el primer evento y se va re-renderizando
+    const asegurarBubble = () => {
+      if (!bubble) {
+        quitarTyping();
+        bubble = agregarMensaje('', 'bot').querySelector('.msg-bubble');
+      }
+      return bubble;
+    };
+    const pintar = (extra = '') => {
+      asegurarBubble().innerHTML = renderTexto(acumulado) + extra;
+      chatContainer.scrollTop = chatContainer.scrollHeight;
+    };
+
+    await leerSSE(res, (evento, datos) => {
+      if (evento === 'texto') {
+        acumulado += datos.texto;
+        pintar();
+      } else if (evento === 'tool_inicio') {
+        if (acumulado) acumulado += '\n\n';
+        pintar(`<p class="tool-status">⏳ ${NOMBRES_TOOLS[datos.nombre] || datos.nombre}...</p>`);
+      } else if (evento === 'tool_fin') {
+        pintar();
+      } else if (evento === 'fin') {
+        // El texto final es el que queda persistido: reemplaza lo streameado entre tools
+        acumulado = datos.respuesta;
+        pintar();
+      } else if (evento === 'error') {
+        acumulado = 'Ocurrió un error al generar la respuesta.';
+        pintar();
+      }
+    });
+
+    if (!bubble) {
+      quitarTyping();
+      agregarMensaje('No se recibió respuesta del servidor.', 'bot');
+    }
 
   } catch (err) {
     quitarTyping();
@@ -267,7 +348,11 @@ function enviarSugerencia(texto) {
 // ─── RESET CHAT ───────────────────────────────
 async function resetearChat() {
   try {
-    await fetch(`${BASE_URL}/reset`, { method: 'POST' });
+    await fetch(`${BASE_URL}/reset`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ sesion_id: SESION_ID })
+    });
   } catch (err) {
     // Si falla el reset en backend, igual limpiamos el frontend
   }
@@ -311,6 +396,9 @@ function mostrarPantalla(nombre) {
 
   if (nombre === 'mercados') cargarWatchlist();
   if (nombre === 'portfolio') cargarPortfolio();
+
+  if (nombre === 'mercados' || nombre === 'portfolio') conectarPrecios();
+  else desconectarPrecios();
 }
 
 // ─── WATCHLIST ───────────────────────────────
@@ -340,20 +428,64 @@ async function cargarWatchlist() {
           <div class="wl-card-left">
             <span class="wl-ticker">${item.ticker}</span>
             <span class="wl-nombre">${item.nombre}</span>
+            <span class="wl-fundamental" id="wl-fundamental-${item.ticker}"></span>
           </div>
           <div class="wl-card-right">
-            <span class="wl-precio">$${item.precio} <span class="wl-moneda">${item.moneda}</span></span>
-            <span class="wl-variacion ${varClass}">${varSign}${item.variacion}%</span>
+            <span class="wl-precio" id="wl-precio-${item.ticker}">$${item.precio} <span class="wl-moneda">${item.moneda}</span></span>
+            <span class="wl-variacion ${varClass}" id="wl-var-${item.ticker}">${varSign}${item.variacion}%</span>
+            <span class="wl-tecnico" id="wl-tecnico-${item.ticker}"></span>
           </div>
           <button class="wl-remove" onclick="eliminarTicker('${item.ticker}')" title="Eliminar">✕</button>
         </div>`;
     }).join('');
 
+    cargarTecnicoWatchlist();
+    cargarFundamentalesWatchlist();
+
   } catch (err) {
     container.innerHTML = '<div class="wl-loading">❌ Error al conectar con el servidor.</div>';
   }
 }
 
+// Señales técnicas de toda la watchlist en un solo pedido; se agregan a las tarjetas ya dibujadas
+async function cargarTecnicoWatchlist() {
+  try {
+    const res = await fetch(`${BASE_URL}/watchlist/tecnico`);
+    const data = await res.json();
+    for (const [ticker, ind] of Object.entries(data.items)) {
+      const el = document.getElementById(`wl-tecnico-${ticker}`);
+      if (!el || ind.error || ind.rsi === null) continue;
+      const clase = ind.rsi >= 70 ? 'signal-red' : ind.rsi <= 30 ? 'signal-green' : 'signal-neutral';
+      el.innerHTML = `<span class="signal-tag ${clase}">RSI ${ind.rsi.toFixed(0)}</span>`;
+    }
+  } catch (err) {
+    // Las señales son un extra: si fallan, la watchlist se muestra igual
+  }
+}
+
+// Sector y P/E en los spans `${prefijo}-${ticker}` que ya estén dibujados
+function pintarFundamentales(items, prefijo) {
+  for (const [ticker, f] of Object.entries(items)) {
+    const el = document.getElementById(`${prefijo}-${ticker}`);
+    if (!el) continue;
+    const partes = [];
+    if (f.sector) partes.push(f.sector);
+    if (f.pe) partes.push(`P/E ${f.pe.toFixed(1)}`);
+    el.textContent = partes.join(' · ');
+    el.title = `Datos al ${f.fecha}`;
+  }
+}
+
+async function cargarFundamentalesWatchlist() {
+  try {
+    const res = await fetch(`${BASE_URL}/watchlist/fundamentales`);
+    const data = await res.json();
+    pintarFundamentales(data.items, 'wl-fundamental');
+  } catch (err) {
+    // Igual que las señales técnicas: es un extra
+  }
+}
+
 async function agregarDesdeInput() {
   const input = document.getElementById('inputTicker');
   const ticker = input.value.trim().toUpperCase();
@@ -374,6 +506,24 @@ async function eliminarTicker(ticker) {
   cargarWatchlist();
 }
 
+// Autocompletado de tickers desde el índice de símbolos del backend (no consulta el mercado)
+let timerSimbolos = null;
+function sugerirSimbolos(e) {
+  const q = e.target.value.trim();
+  clearTimeout(timerSimbolos);
+  if (!q) return;
+  timerSimbolos = setTimeout(async () => {
+    try {
+      const res = await fetch(`${BASE_URL}/simbolos?q=${encodeURIComponent(q)}`);
+      const data = await res.json();
+      document.getElementById('simbolosSugeridos').innerHTML = data.items
+        .map(s => `<option value="${s.ticker}">${s.nombre}</option>`).join('');
+    } catch (err) {
+      // Sin sugerencias se puede seguir escribiendo el ticker a mano
+    }
+  }, 200);
+}
+
 // Enter en el input de watchlist
 document.addEventListener('DOMContentLoaded', () => {
   const inputTicker = document.getElementById('inputTicker');
@@ -381,16 +531,22 @@ document.addEventListener('DOMContentLoaded', () => {
     inputTicker.addEventListener('keydown', (e) => {
       if (e.key === 'Enter') agregarDesdeInput();
     });
+    inputTicker.addEventListener('input', sugerirSimbolos);
   }
   const inputPfTicker = document.getElementById('pf-ticker');
   if (inputPfTicker) {
     inputPfTicker.addEventListener('keydown', (e) => {
       if (e.key === 'Enter') agregarPosicion();
     });
+    inputPfTicker.addEventListener('input', sugerirSimbolos);
   }
 });
 
 // ─── PORTFOLIO ────────────────────────────────
+let portfolioData = null;
+// Se guardan para volver a pintarlos cuando los precios en vivo redibujan las tarjetas
+let fundamentalesPortfolio = {};
+
 async function cargarPortfolio() {
   const container = document.getElementById('portfolioContainer');
   const resumen = document.getElementById('portfolioResumen');
@@ -399,69 +555,87 @@ async function cargarPortfolio() {
 
   try {
     const res = await fetch(`${BASE_URL}/portfolio`);
-    const data = await res.json();
+    portfolioData = await res.json();
+    renderPortfolio(portfolioData);
+    cargarFundamentalesPortfolio();
+  } catch (err) {
+    container.innerHTML = '<div class="wl-loading">❌ Error al conectar con el servidor.</div>';
+  }
+}
 
-    // Resumen total
-    const gTotalClass = data.ganancia_total >= 0 ? 'var-green' : 'var-red';
-    const gTotalSign = data.ganancia_total >= 0 ? '+' : '';
-    resumen.innerHTML = `
-      <div class="pf-resumen">
-        <div class="pf-resumen-item">
-          <span class="pf-resumen-label">Valor actual</span>
-          <span class="pf-resumen-valor">$${data.total_actual.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
-        </div>
-        <div class="pf-resumen-item">
-          <span class="pf-resumen-label">Invertido</span>
-          <span class="pf-resumen-valor muted">$${data.total_invertido.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
-        </div>
-        <div class="pf-resumen-item">
-          <span class="pf-resumen-label">Ganancia total</span>
-          <span class="pf-resumen-valor ${gTotalClass}">${gTotalSign}$${Math.abs(data.ganancia_total).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})} (${gTotalSign}${data.ganancia_total_pct.toFixed(2)}%)</span>
-        </div>
-      </div>`;
+async function cargarFundamentalesPortfolio() {
+  try {
+    const res = await fetch(`${BASE_URL}/portfolio/fundamentales`);
+    fundamentalesPortfolio = (await res.json()).items;
+    pintarFundamentales(fundamentalesPortfolio, 'pf-fundamental');
+  } catch (err) {
+    // Es un extra: el portfolio se muestra igual
+  }
+}
 
-    if (data.items.length === 0) {
-      container.innerHTML = `
-        <div class="wl-empty">
-          <div class="wl-empty-icon">📊</div>
-          <p>Tu portfolio está vacío.</p>
-          <p class="wl-empty-sub">Agregá una posición abajo con el ticker, cantidad y precio de compra.</p>
-        </div>`;
-      return;
-    }
+function renderPortfolio(data) {
+  const container = document.getElementById('portfolioContainer');
+  const resumen = document.getElementById('portfolioResumen');
 
-    // Calcular distribución
-    const totalActual = data.total_actual || 1;
+  // Resumen total
+  const gTotalClass = data.ganancia_total >= 0 ? 'var-green' : 'var-red';
+  const gTotalSign = data.ganancia_total >= 0 ? '+' : '';
+  resumen.innerHTML = `
+    <div class="pf-resumen">
+      <div class="pf-resumen-item">
+        <span class="pf-resumen-label">Valor actual</span>
+        <span class="pf-resumen-valor">$${data.total_actual.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
+      </div>
+      <div class="pf-resumen-item">
+        <span class="pf-resumen-label">Invertido</span>
+        <span class="pf-resumen-valor muted">$${data.total_invertido.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
+      </div>
+      <div class="pf-resumen-item">
+        <span class="pf-resumen-label">Ganancia total</span>
+        <span class="pf-resumen-valor ${gTotalClass}">${gTotalSign}$${Math.abs(data.ganancia_total).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})} (${gTotalSign}${data.ganancia_total_pct.toFixed(2)}%)</span>
+      </div>
+    </div>`;
+
+  if (data.items.length === 0) {
+    container.innerHTML = `
+      <div class="wl-empty">
+        <div class="wl-empty-icon">📊</div>
+        <p>Tu portfolio está vacío.</p>
+        <p class="wl-empty-sub">Agregá una posición abajo con el ticker, cantidad y precio de compra.</p>
+      </div>`;
+    return;
+  }
 
-    container.innerHTML = data.items.map(item => {
-      const gClass = item.ganancia >= 0 ? 'var-green' : 'var-red';
-      const gSign = item.ganancia >= 0 ? '+' : '';
-      const pct = ((item.valor_actual / totalActual) * 100).toFixed(1);
-      return `
-        <div class="pf-card">
-          <div class="pf-card-top">
-            <div class="pf-card-left">
-              <span class="wl-ticker">${item.ticker}</span>
-              <span class="wl-nombre">${item.nombre}</span>
-            </div>
-            <div class="pf-card-right">
-              <span class="wl-precio">$${item.precio_actual.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})} <span class="wl-moneda">${item.moneda}</span></span>
-              <span class="wl-variacion ${gClass}">${gSign}${item.ganancia_pct.toFixed(2)}%</span>
-            </div>
-            <button class="wl-remove" onclick="eliminarPosicion('${item.ticker}')" title="Eliminar">✕</button>
+  // Calcular distribución
+  const totalActual = data.total_actual || 1;
+
+  container.innerHTML = data.items.map(item => {
+    const gClass = item.ganancia >= 0 ? 'var-green' : 'var-red';
+    const gSign = item.ganancia >= 0 ? '+' : '';
+    const pct = ((item.valor_actual / totalActual) * 100).toFixed(1);
+    return `
+      <div class="pf-card">
+        <div class="pf-card-top">
+          <div class="pf-card-left">
+            <span class="wl-ticker">${item.ticker}</span>
+            <span class="wl-nombre">${item.nombre}</span>
+            <span class="wl-fundamental" id="pf-fundamental-${item.ticker}"></span>
           </div>
-          <div class="pf-card-bottom">
-            <span class="pf-meta">${item.cantidad} acc · compra $${item.precio_compra.toLocaleString('en-US', {minimumFractionDigits: 2})} · valor $${item.valor_actual.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
-            <span class="pf-meta ${gClass}">${gSign}$${Math.abs(item.ganancia).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
-            <div class="pf-dist-bar-track"><div class="pf-dist-bar-fill" style="width:${pct}%"></div></div>
-            <span class="pf-dist-pct">${pct}% del portfolio</span>
+          <div class="pf-card-right">
+            <span class="wl-precio">$${item.precio_actual.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})} <span class="wl-moneda">${item.moneda}</span></span>
+            <span class="wl-variacion ${gClass}">${gSign}${item.ganancia_pct.toFixed(2)}%</span>
           </div>
-        </div>`;
-    }).join('');
-
-  } catch (err) {
-    container.innerHTML = '<div class="wl-loading">❌ Error al conectar con el servidor.</div>';
-  }
+          <button class="wl-remove" onclick="eliminarPosicion('${item.ticker}')" title="Eliminar">✕</button>
+        </div>
+        <div class="pf-card-bottom">
+          <span class="pf-meta">${item.cantidad} acc · compra $${item.precio_compra.toLocaleString('en-US', {minimumFractionDigits: 2})} · valor $${item.valor_actual.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
+          <span class="pf-meta ${gClass}">${gSign}$${Math.abs(item.ganancia).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</span>
+          <div class="pf-dist-bar-track"><div class="pf-dist-bar-fill" style="width:${pct}%"></div></div>
+          <span class="pf-dist-pct">${pct}% del portfolio</span>
+        </div>
+      </div>`;
+  }).join('');
+  pintarFundamentales(fundamentalesPortfolio, 'pf-fundamental');
 }
 
 async function agregarPosicion() {
@@ -492,3 +666,65 @@ async function eliminarPosicion(ticker) {
   await fetch(`${BASE_URL}/portfolio/${ticker}`, { method: 'DELETE' });
   cargarPortfolio();
 }
+
+// ─── PRECIOS EN VIVO ──────────────────────────
+// El backend manda por WebSocket solo los tickers cuyo precio cambió
+let wsPrecios = null;
+
+function conectarPrecios() {
+  if (wsPrecios) return;
+  wsPrecios = new WebSocket(`${BASE_URL.replace(/^http/, 'ws')}/ws/precios`);
+
+  wsPrecios.onmessage = (e) => {
+    const msg = JSON.parse(e.data);
+    if (msg.tipo === 'precios') aplicarPrecios(msg.cambios);
+  };
+  wsPrecios.onclose = () => {
+    wsPrecios = null;
+    // Reintentar mientras alguna pantalla con precios siga abierta
+    setTimeout(() => { if (pantallaConPrecios()) conectarPrecios(); }, 5000);
+  };
+}
+
+function desconectarPrecios() {
+  if (!wsPrecios) return;
+  wsPrecios.onclose = null;
+  wsPrecios.close();
+  wsPrecios = null;
+}
+
+function pantallaConPrecios() {
+  return ['mercados', 'portfolio'].some(p => document.getElementById(`pantalla-${p}`).style.display === 'flex');
+}
+
+function aplicarPrecios(cambios) {
+  // Watchlist: se actualizan las tarjetas en el lugar
+  for (const [ticker, c] of Object.entries(cambios)) {
+    const precio = document.getElementById(`wl-precio-${ticker}`);
+    const variacion = document.getElementById(`wl-var-${ticker}`);
+    if (!precio || !variacion) continue;
+    precio.innerHTML = `$${c.precio} <span class="wl-moneda">${c.moneda}</span>`;
+    variacion.textContent = `${c.variacion >= 0 ? '+' : ''}${c.variacion}%`;
+    variacion.className = `wl-variacion ${c.variacion >= 0 ? 'var-green' : 'var-red'}`;
+  }
+
+  // Portfolio: se recalculan valores y totales con los precios nuevos
+  if (!portfolioData) return;
+  let tocado = false;
+  for (const item of portfolioData.items) {
+    const c = cambios[item.ticker];
+    if (!c) continue;
+    tocado = true;
+    const valorCompra = item.cantidad * item.precio_compra;
+    item.precio_actual = c.precio;
+    item.valor_actual = item.cantidad * c.precio;
+    item.ganancia = item.valor_actual - valorCompra;
+    item.ganancia_pct = valorCompra ? (item.ganancia / valorCompra * 100) : 0;
+  }
+  if (!tocado) return;
+  portfolioData.total_actual = portfolioData.items.reduce((s, i) => s + i.valor_actual, 0);
+  portfolioData.ganancia_total = portfolioData.total_actual - portfolioData.total_invertido;
+  portfolioData.ganancia_total_pct = portfolioData.total_invertido
+    ? (portfolioData.ganancia_total / portfolioData.total_invertido * 100) : 0;
+  if (document.getElementById('pantalla-portfolio').style.display === 'flex') renderPortfolio(portfolioData);
+}